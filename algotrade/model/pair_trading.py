@@ -12,16 +12,13 @@ import matplotlib.pyplot as plt
 import statsmodels.tsa.stattools as sts
 from ccalendar import CCalendar
 from sklearn.model_selection import train_test_split
-from common import get_dates_array, get_tushare_client, add_suffix, delta_days, create_redis_obj, transfer_int_to_date_string
+from common import get_tushare_client, add_suffix, delta_days, create_redis_obj, transfer_int_to_date_string
 fpath     = '/Users/hellobiek/Documents/workspace/python/quant/smart_deal_tool/configure/tushare.json' 
 mredis    = create_redis_obj(host = "127.0.0.1")
 ts_client = get_tushare_client(fpath)
 
 def select_code(code_list, start_date, end_date):
-    date_arrays = list()
-    for mdate in get_dates_array(start_date, end_date, dformat = "%Y%m%d"):
-        if CCalendar.is_trading_day(transfer_int_to_date_string(mdate), redis = mredis):
-            date_arrays.append(mdate)
+    date_arrays = CCalendar.get_trading_days(transfer_int_to_date_string(start_date), transfer_int_to_date_string(end_date), redis = mredis)
     #choose stock which is not suspended verry long
     total_df = pd.DataFrame()
     for code in code_list:
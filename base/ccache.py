@@ -0,0 +1,71 @@
+#coding=utf-8
+import _pickle
+import pandas as pd
+from base.clog import getLogger
+logger = getLogger(__name__)
+class CFrameCache:
+    #process-local cache of the pickled dataframes in redis,
+    #writers save the blob and bump "<key>_version" in one transaction,
+    #readers only get the version and unpickle the blob again when it changes.
+    #blobs written without a version are never cached
+    def __init__(self):
+        self.frames = dict()
+        self.indexes = dict()
+
+    @staticmethod
+    def get_version_key(key):
+        return "%s_version" % key
+
+    def set(self, redis, key, df):
+        with redis.pipeline(transaction = True) as pipe:
+            pipe.set(key, _pickle.dumps(df, 2)).incr(self.get_version_key(key))
+        return True == pipe.results[0]
+
+    def load(self, redis, key):
+        version = redis.get(self.get_version_key(key))
+        if version is not None and key in self.frames and self.frames[key][0] == version:
+            return self.frames[key][1]
+        with redis.pipeline(transaction = True) as pipe:
+            pipe.get(key).get(self.get_version_key(key))
+        df_byte, version = pipe.results
+        if df_byte is None:
+            self.clear(key)
+            return None
+        df = _pickle.loads(df_byte)
+        self.clear(key)
+        if version is not None: self.frames[key] = (version, df)
+        return df
+
+    def clear(self, key):
+        self.frames.pop(key, None)
+        for index_key in [index_key for index_key in self.indexes if index_key[0] == key]:
+            del self.indexes[index_key]
+
+    def get(self, redis, key, copy = True):
+        #the cached frame is shared, do not modify it when copy is False
+        df = self.load(redis, key)
+        if df is None: return pd.DataFrame()
+        return df.copy() if copy else df
+
+    def get_index(self, key, column, df):
+        #map of column value to the position of its first row, kept until the frame changes
+        index_key = (key, column)
+        if index_key in self.indexes and self.indexes[index_key][0] is df: return self.indexes[index_key][1]
+        index = dict()
+        for pos, item in enumerate(df[column].tolist()): index.setdefault(item, pos)
+        if key in self.frames: self.indexes[index_key] = (df, index)
+        return index
+
+    def get_value(self, redis, key, column, value, attribute):
+        #attribute of the first row whose column equals value, None if there is no such row
+        df = self.load(redis, key)
+        if df is None or column not in df.columns: return None
+        pos = self.get_index(key, column, df).get(value)
+        return None if pos is None else df[attribute].values[pos]
+
+    def get_rows(self, redis, key, column, value):
+        df = self.load(redis, key)
+        if df is None: return pd.DataFrame()
+        return df.loc[df[column] == value]
+
+frame_cache = CFrameCache()
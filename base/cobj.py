@@ -2,7 +2,7 @@
 import const as ct
 from cmysql import CMySQL
 from base.cclass import CClass
-from common import create_redis_obj
+from common import create_redis_obj, is_redis_member
 class CMysqlObj(CClass):
     __slots__ = ("code", "redis", "mysql_client")
     def __init__(self, code, dbname, dbinfo, redis_host):
@@ -19,14 +19,10 @@ class CMysqlObj(CClass):
         return self.mysql_client.create_db(db_name)
 
     def is_table_exists(self, table_name):
-        if self.redis.exists(self.dbname):
-            return table_name in set(table.decode() for table in self.redis.smembers(self.dbname))
-        return False
+        return is_redis_member(self.redis, self.dbname, table_name)
 
     def is_date_exists(self, table_name, cdate):
-        if self.redis.exists(table_name):
-            return cdate in set(tdate.decode() for tdate in self.redis.smembers(table_name))
-        return False
+        return is_redis_member(self.redis, table_name, cdate)
     
     def get_existed_keys_list(self, table_name):
         if self.redis.exists(table_name):
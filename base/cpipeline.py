@@ -0,0 +1,178 @@
+#coding=utf-8
+import os
+import time
+import gevent
+import const as ct
+from collections import deque
+from gevent.queue import Queue
+from gevent.socket import wait_read, timeout
+from base.clog import getLogger
+from multiprocessing import Process, Pipe
+logger = getLogger(__name__)
+def run_compute_worker(compute_func, task_conn, result_conn):
+    #compute process, it only does cpu bound work and never yields to the hub copied from the parent
+    while True:
+        task = task_conn.recv()
+        if task is None: break
+        item, data = task
+        result = None
+        try:
+            result = compute_func(item, data)
+        except Exception as e:
+            logger.error("compute %s failed:%s" % (item, e))
+        result_conn.send(result)
+
+class CStageStats:
+    def __init__(self, name):
+        self.name = name
+        self.count = 0
+        self.failed = 0
+        self.busy = 0.0
+        self.start_time = time.time()
+
+    def add(self, start_time, succeed):
+        self.count += 1
+        if not succeed: self.failed += 1
+        self.busy += time.time() - start_time
+
+    def report(self, queue = None):
+        #busy is summed over the concurrent greenlets or processes of the stage
+        elapsed = max(time.time() - self.start_time, 1e-6)
+        qsize = '' if queue is None else ', queue:%s' % queue.qsize()
+        logger.info("stage %s: %s items, %s failed, %.2f items/s, busy:%.2fs%s" % (self.name, self.count, self.failed, self.count / elapsed, self.busy, qsize))
+
+class CStagePipeline:
+    #read -> compute -> write pipeline connected by bounded queues, so a slow stage blocks the one before it.
+    #read and write are io bound and run in greenlets of this process,
+    #compute is cpu bound and runs in a pool of processes sized to the cores.
+    #read_func(item) returns (succeed, data), the item is finished when data is None,
+    #compute_func(item, data) returns the result or None when failed, write_func(item, result) returns True when succeed
+    def __init__(self, read_func, compute_func, write_func, process_num = None, read_num = 10, write_num = 5, queue_size = ct.PIPELINE_QUEUE_SIZE):
+        self.read_func = read_func
+        self.compute_func = compute_func
+        self.write_func = write_func
+        self.process_num = os.cpu_count() if process_num is None else process_num
+        self.read_num = read_num
+        self.write_num = write_num
+        self.queue_size = queue_size
+
+    def start_worker(self, index):
+        #one-way pipes are blocking os pipes, a duplex pipe is a socket pair which is non-blocking when gevent patches socket
+        task_reader, task_writer = Pipe(duplex = False)
+        result_reader, result_writer = Pipe(duplex = False)
+        p = Process(target = run_compute_worker, args = (self.compute_func, task_reader, result_writer))
+        p.start()
+        task_reader.close()
+        result_writer.close()
+        self.workers[index] = (p, task_writer, result_reader)
+
+    def close_worker(self, index):
+        p, task_writer, result_reader = self.workers.pop(index)
+        try:
+            task_writer.send(None)
+        except OSError:
+            pass
+        task_writer.close()
+        result_reader.close()
+        p.join()
+
+    def wait_result(self, p, result_reader):
+        #EOF does not tell a dead worker, gevent closes pipes lazily so processes forked later may inherit the write end.
+        #socket.timeout is only an alias of TimeoutError since python 3.10
+        while True:
+            try:
+                wait_read(result_reader.fileno(), timeout = 1)
+                return result_reader.recv()
+            except timeout:
+                if p.is_alive(): continue
+                if result_reader.poll(): return result_reader.recv()
+                raise EOFError("exit code %s" % p.exitcode)
+
+    def compute(self, index, item, data):
+        p, task_writer, result_reader = self.workers[index]
+        try:
+            task_writer.send((item, data))
+            return self.wait_result(p, result_reader)
+        except (EOFError, OSError) as e:
+            logger.error("compute worker %s for %s exit unexpectedly:%s" % (p.pid, item, e))
+            self.close_worker(index)
+            self.start_worker(index)
+            return None
+
+    def read(self):
+        while len(self.todo_list) > 0:
+            item = self.todo_list.popleft()
+            start_time = time.time()
+            try:
+                succeed, data = self.read_func(item)
+            except Exception as e:
+                logger.error("read %s failed:%s" % (item, e))
+                succeed, data = False, None
+            self.read_stats.add(start_time, succeed)
+            if not succeed:
+                self.failed_list.append(item)
+            elif data is not None:
+                self.read_queue.put((item, data))
+
+    def dispatch(self, index):
+        while True:
+            task = self.read_queue.get()
+            if task is None: break
+            item, data = task
+            start_time = time.time()
+            result = self.compute(index, item, data)
+            self.compute_stats.add(start_time, result is not None)
+            if result is None:
+                self.failed_list.append(item)
+            else:
+                self.write_queue.put((item, result))
+
+    def write(self):
+        while True:
+            task = self.write_queue.get()
+            if task is None: break
+            item, result = task
+            start_time = time.time()
+            try:
+                succeed = self.write_func(item, result)
+            except Exception as e:
+                logger.error("write %s failed:%s" % (item, e))
+                succeed = False
+            self.write_stats.add(start_time, succeed)
+            if not succeed: self.failed_list.append(item)
+
+    def report(self):
+        self.read_stats.report()
+        self.compute_stats.report(self.read_queue)
+        self.write_stats.report(self.write_queue)
+
+    def monitor(self):
+        while True:
+            gevent.sleep(ct.PIPELINE_REPORT_INTERVAL)
+            self.report()
+
+    def run(self, todo_list):
+        #return the failed items
+        self.todo_list = deque(todo_list)
+        self.failed_list = list()
+        self.read_queue = Queue(self.queue_size)
+        self.write_queue = Queue(self.queue_size)
+        self.read_stats = CStageStats('read')
+        self.compute_stats = CStageStats('compute')
+        self.write_stats = CStageStats('write')
+        #fork the compute processes before any greenlet of the pipeline is spawned
+        self.workers = dict()
+        for index in range(self.process_num): self.start_worker(index)
+        monitor = gevent.spawn(self.monitor)
+        readers = [gevent.spawn(self.read) for i in range(self.read_num)]
+        dispatchers = [gevent.spawn(self.dispatch, index) for index in range(self.process_num)]
+        writers = [gevent.spawn(self.write) for i in range(self.write_num)]
+        gevent.joinall(readers)
+        for i in range(self.process_num): self.read_queue.put(None)
+        gevent.joinall(dispatchers)
+        for i in range(self.write_num): self.write_queue.put(None)
+        gevent.joinall(writers)
+        monitor.kill()
+        for index in range(self.process_num): self.close_worker(index)
+        self.report()
+        return self.failed_list
@@ -6,6 +6,98 @@ import time
 import redis
 from base.clog import getLogger
 logger = getLogger(__name__)
+def get_mget_default(keys, *args):
+    return [None] * (len(keys) + len(args) if isinstance(keys, (list, tuple)) else 1 + len(args))
+
+#supported commands and the values returned when redis is not available
+COMMAND_DEFAULTS = {
+    'exists': lambda *args: False,
+    'smembers': lambda *args: set(),
+    'sismember': lambda *args: False,
+    'sadd': lambda *args: 0,
+    'srem': lambda *args: 0,
+    'delete': lambda *args: 0,
+    'get': lambda *args: None,
+    'set': lambda *args: False,
+    'incr': lambda *args: None,
+    'mget': get_mget_default,
+    'hget': lambda *args: None,
+    'hset': lambda *args: 0,
+}
+
+class CRedisPipeline:
+    #commands are queued and sent in one round trip when execute is called or the with block exits,
+    #results are in the order of the queued commands
+    def __init__(self, credis, transaction = False):
+        self.credis = credis
+        self.pipe = credis.client.pipeline(transaction = transaction)
+        self.commands = list()
+        self.results = list()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.execute()
+        else:
+            self.pipe.reset()
+            self.commands = list()
+        return False
+
+    def queue(self, name, *args, **kwargs):
+        if name not in COMMAND_DEFAULTS: raise Exception("not supported method for redis pipeline")
+        getattr(self.pipe, name)(*args, **kwargs)
+        self.commands.append((name, args))
+        return self
+
+    def execute(self):
+        try:
+            self.results = self.pipe.execute()
+        except Exception as e:
+            logger.debug(e)
+            self.pipe.reset()
+            self.credis.wait_redis_available()
+            self.results = [COMMAND_DEFAULTS[name](*args) for name, args in self.commands]
+        self.commands = list()
+        return self.results
+
+    def exists(self, *args, **kwargs):
+        return self.queue('exists', *args, **kwargs)
+
+    def smembers(self, *args, **kwargs):
+        return self.queue('smembers', *args, **kwargs)
+
+    def sismember(self, *args, **kwargs):
+        return self.queue('sismember', *args, **kwargs)
+
+    def sadd(self, *args, **kwargs):
+        return self.queue('sadd', *args, **kwargs)
+
+    def srem(self, *args, **kwargs):
+        return self.queue('srem', *args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        return self.queue('delete', *args, **kwargs)
+
+    def get(self, *args, **kwargs):
+        return self.queue('get', *args, **kwargs)
+
+    def set(self, *args, **kwargs):
+        return self.queue('set', *args, **kwargs)
+
+    def incr(self, *args, **kwargs):
+        return self.queue('incr', *args, **kwargs)
+
+    def mget(self, *args, **kwargs):
+        return self.queue('mget', *args, **kwargs)
+
+    def hget(self, *args, **kwargs):
+        return self.queue('hget', *args, **kwargs)
+
+    def hset(self, *args, **kwargs):
+        return self.queue('hset', *args, **kwargs)
+
 class CRedis:
     def __init__(self, host, port, decode_responses):
         mpool = redis.ConnectionPool(host = host, port = port, decode_responses = decode_responses)
@@ -13,34 +105,14 @@ class CRedis:
 
     def execute_command(self, name, *args, **kwargs):
         try:
-            if name == 'exists':
-                return self.client.exists(*args, **kwargs)
-            elif name == 'smembers':
-                return self.client.smembers(*args, **kwargs)
-            elif name == 'sadd':
-                return self.client.sadd(*args, **kwargs)
-            elif name == 'srem':
-                return self.client.srem(*args, **kwargs)
-            elif name == 'delete':
-                return self.client.delete(*args, **kwargs)
-            elif name == 'get':
-                return self.client.get(*args, **kwargs)
-            elif name == 'set':
-                return self.client.set(*args, **kwargs)
-            else:
-                raise Exception("not supported method for redis client")
+            if name not in COMMAND_DEFAULTS: raise Exception("not supported method for redis client")
+            return getattr(self.client, name)(*args, **kwargs)
         except Exception as e:
             self.wait_redis_available()
-            if name == 'smembers':
-                return set()
-            elif name == 'exists' or name == 'set':
-                return False
-            elif name == 'sadd' or name == 'srem' or name == 'delete':
-                return 0
-            elif name == 'get':
-                return None
-            else:
-                return None
+            return COMMAND_DEFAULTS[name](*args) if name in COMMAND_DEFAULTS else None
+
+    def pipeline(self, transaction = False):
+        return CRedisPipeline(self, transaction)
 
     def wait_redis_available(self, retry_times = 3):
         for i in range(retry_times):
@@ -59,6 +131,9 @@ class CRedis:
     def smembers(self, *args, **kwargs):
         return self.execute_command('smembers', *args, **kwargs)
 
+    def sismember(self, *args, **kwargs):
+        return self.execute_command('sismember', *args, **kwargs)
+
     def sadd(self, *args, **kwargs):
         return self.execute_command('sadd', *args, **kwargs)
 
@@ -74,6 +149,18 @@ class CRedis:
     def set(self, *args, **kwargs):
         return self.execute_command('set', *args, **kwargs)
 
+    def incr(self, *args, **kwargs):
+        return self.execute_command('incr', *args, **kwargs)
+
+    def mget(self, *args, **kwargs):
+        return self.execute_command('mget', *args, **kwargs)
+
+    def hget(self, *args, **kwargs):
+        return self.execute_command('hget', *args, **kwargs)
+
+    def hset(self, *args, **kwargs):
+        return self.execute_command('hset', *args, **kwargs)
+
 if __name__ == '__main__':
     client = CRedis('127.0.0.1', 6379, False)
     test_key = 'ABCDEFG'
@@ -87,5 +174,9 @@ if __name__ == '__main__':
     print(client.sadd(test_key, db))
     print(client.set(test_key, db1))
     print(client.get(test_key))
+    print(client.mget([test_key, db]))
+    with client.pipeline() as pipe:
+        pipe.sadd(db, test_key).sismember(db, test_key).srem(db, test_key)
+    print(pipe.results)
     print(client.delete(test_key))
     print(client.exists(test_key))
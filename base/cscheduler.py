@@ -0,0 +1,312 @@
+#coding=utf-8
+import os
+import time
+import heapq
+import shutil
+import signal
+import gevent
+import tempfile
+import const as ct
+import numpy as np
+import pandas as pd
+from collections import deque
+from gevent.pool import Pool
+from base.clog import getLogger
+from multiprocessing import Process, Pipe
+logger = getLogger(__name__)
+TASK_STARTED = 'started'
+TASK_REQUEST = 'request'
+TASK_BATCH = 'batch'
+TASK_DONE = 'done'
+#prefix of the mask columns of the nulls in object columns
+NULL_MASK_PREFIX = '__null_'
+def to_record_batch(df):
+    #object columns are saved as fixed width unicode, so a batch is loaded without pickle,
+    #nulls of an object column are saved as '' and restored from a mask column
+    object_columns = [column for column in df.columns if df[column].dtype == object]
+    for column in object_columns:
+        nulls = df[column].isnull().values
+        if nulls.any():
+            df = df.assign(**{column: df[column].where(~nulls, ''), NULL_MASK_PREFIX + column: nulls})
+    column_dtypes = {column: np.array(df[column].astype(str).tolist()).dtype for column in object_columns}
+    return df.to_records(index = False, column_dtypes = column_dtypes)
+
+def from_record_batch(records):
+    df = pd.DataFrame(records)
+    for mask_column in [column for column in df.columns if column.startswith(NULL_MASK_PREFIX)]:
+        column = mask_column[len(NULL_MASK_PREFIX):]
+        df[column] = df[column].astype(object)
+        df.loc[df[mask_column].values, column] = None
+        df = df.drop(mask_column, axis = 1)
+    return df
+
+class CBatchSink:
+    #collects the frames of finished tasks in a worker and saves them as one numpy record batch,
+    #only the path is sent to the parent, so the memory of a worker is bounded by batch_rows.
+    #tasks in a batch are reported as succeed only after the batch is saved
+    def __init__(self, dirname, batch_rows, result_conn):
+        self.dirname = dirname
+        self.batch_rows = batch_rows
+        self.result_conn = result_conn
+        self.batch_id = 0
+        self.items, self.frames, self.rows = list(), list(), 0
+
+    def add(self, item, df):
+        self.items.append(item)
+        if not df.empty:
+            self.frames.append(df)
+            self.rows += len(df)
+        if self.rows >= self.batch_rows: self.flush()
+
+    def flush(self):
+        if len(self.items) == 0: return
+        items, frames = self.items, self.frames
+        self.items, self.frames, self.rows = list(), list(), 0
+        path = None
+        if len(frames) > 0:
+            path = os.path.join(self.dirname, "%s_%s.npy" % (os.getpid(), self.batch_id))
+            np.save(path, to_record_batch(pd.concat(frames, ignore_index = True, sort = False)))
+            self.batch_id += 1
+        self.result_conn.send((os.getpid(), items, path, TASK_BATCH))
+
+def run_task(mfunc, item, attempt, result_conn, timeout, sink = None):
+    #mfunc returns (item, True) when succeed, the same as concurrent_run,
+    #with a sink it returns (item, df) and df is None when failed.
+    #gevent.Timeout only interrupts the waits of io, cpu bound work is stopped by the parent which kills the worker.
+    #a message is written to the pipe before send returns, so the parent knows the task is started even if the worker crashes in it
+    result_conn.send((os.getpid(), item, attempt, TASK_STARTED))
+    succeed = False
+    try:
+        with gevent.Timeout(timeout):
+            result = mfunc(item)
+        if sink is None:
+            succeed = True == result[1]
+        elif result[1] is not None:
+            #the task is reported as succeed when its batch is saved
+            result_conn.send((os.getpid(), item, attempt, TASK_DONE))
+            sink.add(item, result[1])
+            return
+    except gevent.Timeout:
+        logger.error("task %s timeout after %ss" % (item, timeout))
+    except Exception as e:
+        logger.error("task %s failed:%s" % (item, e))
+    result_conn.send((os.getpid(), item, attempt, succeed))
+
+def run_worker(mfunc, conn, result_conn, num, prefetch, timeout, batch_dir = None, batch_rows = None):
+    #a worker asks for tasks whenever it has free greenlets, so a slow task only holds one greenlet
+    #and the other tasks go to the workers which have capacity
+    pid = os.getpid()
+    obj_pool = Pool(num)
+    sink = CBatchSink(batch_dir, batch_rows, result_conn) if batch_dir is not None else None
+    local_tasks = deque()
+    requested = 0
+    finished = False
+    while not finished or len(local_tasks) > 0:
+        want = obj_pool.free_count() + prefetch - len(local_tasks) - requested
+        if not finished and want > 0:
+            result_conn.send((pid, None, want, TASK_REQUEST))
+            requested += want
+        while not finished and conn.poll():
+            tasks = conn.recv()
+            if tasks is None:
+                finished = True
+            else:
+                local_tasks.extend(tasks)
+                requested -= len(tasks)
+        if len(local_tasks) > 0 and obj_pool.free_count() > 0:
+            item, attempt = local_tasks.popleft()
+            obj_pool.spawn(run_task, mfunc, item, attempt, result_conn, timeout, sink)
+        else:
+            #an idle worker saves the partial batch, otherwise its tasks are never reported
+            if sink is not None and len(local_tasks) == 0 and obj_pool.free_count() == num: sink.flush()
+            gevent.sleep(0.05)
+    obj_pool.join()
+    if sink is not None: sink.flush()
+
+class CTaskScheduler:
+    #work-stealing scheduler over processes: tasks are handed out on demand from one shared list,
+    #failed tasks are retried with exponential backoff and the ones which still fail are dead letters,
+    #the running tasks of a crashed worker are treated as failed and the worker is replaced, its tasks which are not started yet
+    #are sent to the other workers with the same attempt. a worker which runs a task longer than timeout + kill_grace is killed,
+    #because gevent.Timeout can not interrupt cpu bound work such as the chip computation.
+    #with batch_rows the frames returned by mfunc are collected through record batches in a temporary directory.
+    #tasks and results are sent through pipes of every worker instead of multiprocessing queues, because the feeder
+    #thread of a queue is a greenlet when gevent patches threading and would be copied into forked workers,
+    #and the messages a queue has not flushed are lost when its worker crashes
+    def __init__(self, mfunc, process_num = ct.TASK_PROCESS_NUM, num = 10, prefetch = 1, timeout = ct.TASK_TIMEOUT, max_retry_times = ct.TASK_RETRY_TIMES,
+                 backoff = ct.TASK_BACKOFF, redis_client = None, key = None, dead_key = ct.DEAD_LETTER_WORKS, batch_rows = None, kill_grace = ct.TASK_KILL_GRACE):
+        self.mfunc = mfunc
+        self.process_num = process_num
+        self.num = num
+        self.prefetch = prefetch
+        self.timeout = timeout
+        self.max_retry_times = max_retry_times
+        self.backoff = backoff
+        self.redis = redis_client
+        self.key = key
+        self.dead_key = dead_key
+        self.batch_rows = batch_rows
+        self.kill_grace = kill_grace
+        self.batch_dir = None
+        self.batch_paths = list()
+
+    def start_worker(self):
+        #a one-way pipe is a blocking os pipe, a duplex pipe is a socket pair which is non-blocking when gevent patches socket
+        child_conn, parent_conn = Pipe(duplex = False)
+        result_reader, result_writer = Pipe(duplex = False)
+        p = Process(target = run_worker, args = (self.mfunc, child_conn, result_writer, self.num, self.prefetch, self.timeout, self.batch_dir, self.batch_rows))
+        p.start()
+        child_conn.close()
+        result_writer.close()
+        self.jobs[p.pid] = (p, parent_conn, result_reader)
+        self.demands[p.pid] = 0
+        self.assigned[p.pid] = dict()
+        self.running[p.pid] = dict()
+
+    def stop_worker(self, pid):
+        p, conn, result_conn = self.jobs.pop(pid)
+        conn.close()
+        result_conn.close()
+        self.demands.pop(pid, None)
+        self.running.pop(pid, None)
+        return self.assigned.pop(pid, dict())
+
+    def receive(self, pid):
+        #the messages of a worker stay in its pipe after it exits, so they are read before its tasks are reclaimed
+        result_conn = self.jobs[pid][2]
+        try:
+            while result_conn.poll(): self.handle(result_conn.recv())
+        except (EOFError, OSError):
+            pass
+
+    def reclaim(self, pid, failed_items):
+        #tasks of a stopped worker in failed_items use up an attempt, the others are queued again with the same attempt
+        for item, attempt in self.stop_worker(pid).items():
+            if item in failed_items:
+                self.on_failed(item, attempt)
+            elif item in self.pending:
+                self.ready_tasks.appendleft((item, attempt))
+
+    def kill_timeout_workers(self, now):
+        for pid, running in list(self.running.items()):
+            expired = [item for item, start_time in running.items() if now - start_time > self.timeout + self.kill_grace]
+            if len(expired) == 0: continue
+            p = self.jobs[pid][0]
+            logger.error("kill worker %s, tasks %s timeout after %ss" % (pid, expired, self.timeout))
+            os.kill(p.pid, signal.SIGKILL)
+            p.join()
+            self.receive(pid)
+            self.reclaim(pid, set(expired))
+
+    def on_succeed(self, item):
+        self.pending.discard(item)
+        self.succeed_num += 1
+        if self.redis is not None and self.key is not None: self.redis.srem(self.key, item)
+
+    def on_failed(self, item, attempt):
+        if item not in self.pending: return
+        if attempt < self.max_retry_times:
+            heapq.heappush(self.retry_heap, (time.time() + self.backoff * 2 ** attempt, item, attempt + 1))
+            return
+        logger.error("task %s failed after %s tries" % (item, attempt + 1))
+        self.pending.discard(item)
+        self.dead_list.append(item)
+        if self.redis is not None and self.dead_key is not None: self.redis.sadd(self.dead_key, item)
+
+    def handle(self, message):
+        pid, item, attempt, status = message
+        if pid not in self.jobs: return
+        if status == TASK_REQUEST:
+            self.demands[pid] += attempt
+        elif status == TASK_STARTED:
+            self.running[pid][item] = time.time()
+        elif status == TASK_DONE:
+            self.running[pid].pop(item, None)
+        elif status == TASK_BATCH:
+            if attempt is not None: self.batch_paths.append(attempt)
+            for batch_item in item:
+                self.assigned[pid].pop(batch_item, None)
+                self.on_succeed(batch_item)
+        else:
+            self.running[pid].pop(item, None)
+            self.assigned[pid].pop(item, None)
+            if status:
+                self.on_succeed(item)
+            else:
+                self.on_failed(item, attempt)
+
+    def dispatch(self):
+        for pid, (p, conn, result_conn) in self.jobs.items():
+            num = min(self.demands[pid], len(self.ready_tasks))
+            if num == 0: continue
+            tasks = [self.ready_tasks.popleft() for i in range(num)]
+            self.demands[pid] -= num
+            self.assigned[pid].update(tasks)
+            try:
+                conn.send(tasks)
+            except OSError as e:
+                #the worker is dead, its assigned tasks are failed when it is found in run
+                logger.error("send tasks to worker %s failed:%s" % (pid, e))
+
+    def run(self, todo_list):
+        #return the dead letters, empty list means all tasks succeed
+        start_time = time.time()
+        self.pending = set(todo_list)
+        self.ready_tasks = deque((item, 0) for item in self.pending)
+        self.retry_heap = list()
+        self.dead_list = list()
+        self.succeed_num = 0
+        self.jobs, self.demands, self.assigned, self.running = dict(), dict(), dict(), dict()
+        if self.redis is not None and self.dead_key is not None: self.redis.delete(self.dead_key)
+        if len(self.pending) == 0: return self.dead_list
+        self.cleanup()
+        if self.batch_rows is not None: self.batch_dir = tempfile.mkdtemp(prefix = 'batch_')
+        for i in range(min(self.process_num, len(self.pending))): self.start_worker()
+        restart_times = 0
+        while len(self.pending) > 0:
+            dead_pids = [pid for pid, (p, conn, result_conn) in self.jobs.items() if not p.is_alive()]
+            for pid in list(self.jobs.keys()): self.receive(pid)
+            now = time.time()
+            while len(self.retry_heap) > 0 and self.retry_heap[0][0] <= now:
+                _, item, attempt = heapq.heappop(self.retry_heap)
+                self.ready_tasks.append((item, attempt))
+            alive_num = len(self.jobs)
+            self.kill_timeout_workers(now)
+            for pid in [pid for pid in dead_pids if pid in self.jobs]:
+                logger.error("worker %s exit unexpectedly with code %s" % (pid, self.jobs[pid][0].exitcode))
+                self.reclaim(pid, set(self.running[pid].keys()))
+            for i in range(alive_num - len(self.jobs)):
+                if restart_times < self.process_num * (self.max_retry_times + 1):
+                    restart_times += 1
+                    self.start_worker()
+            if len(self.jobs) == 0:
+                logger.error("no worker is alive, left tasks:%s" % self.pending)
+                self.dead_list.extend(self.pending)
+                self.pending = set()
+            self.dispatch()
+            time.sleep(0.1)
+        for pid, (p, conn, result_conn) in self.jobs.items():
+            try:
+                conn.send(None)
+            except OSError as e:
+                logger.error("stop worker %s failed:%s" % (pid, e))
+        for pid in list(self.jobs.keys()):
+            #a worker blocks when its pipe is full, so it is read until the worker exits
+            while self.jobs[pid][0].is_alive():
+                self.receive(pid)
+                self.jobs[pid][0].join(0.1)
+            self.stop_worker(pid)
+        logger.info("scheduler finished, succeed:%s, dead:%s, cost:%.2fs" % (self.succeed_num, len(self.dead_list), time.time() - start_time))
+        return self.dead_list
+
+    def collect(self):
+        #load the record batches and concatenate them once, then remove the temporary directory
+        df_list = [from_record_batch(np.load(path)) for path in self.batch_paths]
+        self.cleanup()
+        if len(df_list) == 0: return pd.DataFrame()
+        return pd.concat(df_list, ignore_index = True, sort = False)
+
+    def cleanup(self):
+        if self.batch_dir is not None: shutil.rmtree(self.batch_dir, ignore_errors = True)
+        self.batch_dir = None
+        self.batch_paths = list()
@@ -2,9 +2,53 @@
 import cmysql
 import _pickle
 import const as ct
+import numpy as np
 import pandas as pd
 from datetime import datetime
-from common import create_redis_obj, df_delta
+from base.ccache import frame_cache
+from common import create_redis_obj, df_delta, get_dates_array
+trading_calendar = None
+def to_int_date(cdate):
+    return int(cdate.replace('-', ''))
+
+class CTradingCalendar:
+    #trading dates are kept in a sorted int array YYYYMMDD with a date to ordinal dict,
+    #so membership is O(1) and neighbour or range lookups are O(log n).
+    #an empty calendar treats every day as a trading day, the same as CCalendar.is_trading_day
+    def __init__(self, df):
+        self.empty = df.empty
+        dates = df.loc[df.isOpen == 1].calendarDate.tolist() if not df.empty else list()
+        self.date_strings = sorted(dates)
+        self.dates = np.array([to_int_date(cdate) for cdate in self.date_strings], dtype = np.int32)
+        self.ordinals = {cdate: i for i, cdate in enumerate(self.date_strings)}
+
+    def is_trading_day(self, cdate):
+        return self.empty or cdate in self.ordinals
+
+    def get_ordinal(self, cdate):
+        #ordinal of cdate if it is a trading day, else the ordinal of the next trading day
+        if cdate in self.ordinals: return self.ordinals[cdate]
+        return int(np.searchsorted(self.dates, to_int_date(cdate), 'left'))
+
+    def pre_trading_day(self, cdate, num = 1):
+        #the trading day which is num trading days before cdate
+        index = self.get_ordinal(cdate) - num
+        return self.date_strings[index] if 0 <= index < len(self.date_strings) else None
+
+    def next_trading_day(self, cdate, num = 1):
+        index = int(np.searchsorted(self.dates, to_int_date(cdate), 'right')) + num - 1
+        return self.date_strings[index] if 0 <= index < len(self.date_strings) else None
+
+    def get_trading_days(self, start_date, end_date, asending = True):
+        #trading days between start_date and end_date, both are included
+        start = int(np.searchsorted(self.dates, to_int_date(start_date), 'left'))
+        end = int(np.searchsorted(self.dates, to_int_date(end_date), 'right'))
+        dates = self.date_strings[start:end]
+        return dates if asending else dates[::-1]
+
+    def count_trading_days(self, start_date, end_date):
+        return int(np.searchsorted(self.dates, to_int_date(end_date), 'right') - np.searchsorted(self.dates, to_int_date(start_date), 'left'))
+
 class CCalendar:
     def __init__(self, dbinfo = ct.DB_INFO, without_init = False, redis_host = None, filepath = '/conf/calAll.csv'):
         self.fpath = filepath 
@@ -25,32 +69,40 @@ class CCalendar:
 
     def init(self):
         df = pd.read_csv(self.fpath)
-        return self.redis.set(ct.CALENDAR_INFO, _pickle.dumps(df, 2))
+        return frame_cache.set(self.redis, ct.CALENDAR_INFO, df)
 
     @staticmethod
-    def is_trading_day(_date = None, redis = None):
+    def get_trading_calendar(redis = None):
+        #rebuilt only when the cached calendar frame changes
+        global trading_calendar
         _redis = create_redis_obj() if redis is None else redis
-        df = CCalendar.get(redis = _redis)
+        df = frame_cache.get(_redis, ct.CALENDAR_INFO, copy = False)
+        if trading_calendar is None or trading_calendar[0] is not df:
+            trading_calendar = (df, CTradingCalendar(df))
+        return trading_calendar[1]
+
+    @staticmethod
+    def is_trading_day(_date = None, redis = None):
         tmp_date = _date if _date is not None else datetime.now().strftime('%Y-%m-%d')
-        return True if df.empty else 1 == df.loc[df.calendarDate == tmp_date].isOpen.values[0]
+        return CCalendar.get_trading_calendar(redis).is_trading_day(tmp_date)
+
+    @staticmethod
+    def get_trading_days(start_date, end_date, asending = True, redis = None):
+        calendar = CCalendar.get_trading_calendar(redis)
+        if calendar.empty: return get_dates_array(start_date, end_date, asending = asending).tolist()
+        return calendar.get_trading_days(start_date, end_date, asending)
 
     @staticmethod
     def get(_date = None, redis = None):
         _redis = create_redis_obj() if redis is None else redis
-        df_byte = _redis.get(ct.CALENDAR_INFO)
-        if df_byte is None: return pd.DataFrame() 
-        df = _pickle.loads(df_byte)
-        return df if _date is None else df.loc[df.calendarDate == _date]
-
-    def pre_trading_day(self, _date):
-        df = self.get()
-        _index = df[df.calendarDate == _date].index.tolist()[0]
-        if _index > 0:
-            _tindex = _index
-            while _tindex > 0:
-                _tindex -= 1
-                if df.isOpen[_tindex] == 1: return df.calendarDate[_tindex]
-        return None
+        if _date is not None: return frame_cache.get_rows(_redis, ct.CALENDAR_INFO, 'calendarDate', _date)
+        return frame_cache.get(_redis, ct.CALENDAR_INFO)
+
+    def pre_trading_day(self, _date, num = 1):
+        return self.get_trading_calendar(self.redis).pre_trading_day(_date, num)
+
+    def next_trading_day(self, _date, num = 1):
+        return self.get_trading_calendar(self.redis).next_trading_day(_date, num)
 
 if __name__ == '__main__':
     ccalendar = CCalendar(ct.DB_INFO, "calendar")
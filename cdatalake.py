@@ -0,0 +1,187 @@
+#coding=utf-8
+import io
+import os
+import json
+import shutil
+import operator
+import const as ct
+import numpy as np
+import pandas as pd
+from base.clog import getLogger
+logger = getLogger(__name__)
+OPERATOR_FUNCS = {'=': operator.eq, '!=': operator.ne, '<': operator.lt, '<=': operator.le, '>': operator.gt, '>=': operator.ge, 'in': np.isin}
+class CDataLake:
+    #local columnar copy of mysql tables which are keyed by date (or date and code),
+    #every column of a table is a .npy file and is read by memory map,
+    #rows are sorted by keys and date is stored as int YYYYMMDD
+    META_FILE = 'meta.json'
+    def __init__(self, dbname, root = ct.DATA_LAKE_DIR):
+        self.dbname = dbname
+        self.root = os.path.join(root, dbname)
+
+    def get_table_dir(self, table):
+        return os.path.join(self.root, table)
+
+    def get_column_file(self, table, column):
+        return os.path.join(self.get_table_dir(table), "%s.npy" % column)
+
+    def get_null_file(self, table, column):
+        return os.path.join(self.get_table_dir(table), "%s.null.npy" % column)
+
+    def is_table_exists(self, table):
+        return os.path.exists(os.path.join(self.get_table_dir(table), self.META_FILE))
+
+    def get_meta(self, table):
+        with open(os.path.join(self.get_table_dir(table), self.META_FILE)) as f:
+            return json.load(f)
+
+    def get_columns(self, table):
+        return self.get_meta(table)['columns']
+
+    def delete(self, table):
+        shutil.rmtree(self.get_table_dir(table), ignore_errors = True)
+        return True
+
+    @staticmethod
+    def is_nullable(series, column):
+        #strings can not hold null, a mask file of the nulls is kept with them
+        return column != 'date' and series.dtype.kind not in 'iubf'
+
+    @staticmethod
+    def to_array(series, column, nullable = False):
+        if column == 'date': return series.str.replace('-', '').astype(np.int32).values
+        if nullable: return series.where(series.notnull(), '').values.astype(str)
+        if series.dtype.kind in 'iub': return series.values.astype(np.int64)
+        if series.dtype.kind == 'f': return series.values.astype(np.float64)
+        return series.values.astype(str)
+
+    @staticmethod
+    def to_date_strings(int_dates):
+        return ["%04d-%02d-%02d" % (cdate // 10000, cdate // 100 % 100, cdate % 100) for cdate in int_dates.tolist()]
+
+    def set(self, df, table, keys = ['date']):
+        #replace the whole table, files are written to a temporary directory first, keys must start with date
+        table_dir = self.get_table_dir(table)
+        tmp_dir = "%s.tmp" % table_dir
+        df = df.drop_duplicates(subset = keys, keep = 'last')
+        df = df.sort_values(by = keys, ascending = True)
+        try:
+            shutil.rmtree(tmp_dir, ignore_errors = True)
+            os.makedirs(tmp_dir)
+            nulls = [column for column in df.columns if self.is_nullable(df[column], column)]
+            for column in df.columns:
+                np.save(os.path.join(tmp_dir, "%s.npy" % column), self.to_array(df[column], column, column in nulls))
+                if column in nulls: np.save(os.path.join(tmp_dir, "%s.null.npy" % column), df[column].isnull().values)
+            with open(os.path.join(tmp_dir, self.META_FILE), 'w') as f:
+                json.dump({'columns': df.columns.tolist(), 'keys': keys, 'length': len(df), 'nulls': nulls}, f)
+            shutil.rmtree(table_dir, ignore_errors = True)
+            os.rename(tmp_dir, table_dir)
+            return True
+        except Exception as e:
+            logger.error("set %s for %s to data lake failed:%s" % (table, self.dbname, e))
+            shutil.rmtree(tmp_dir, ignore_errors = True)
+            self.delete(table)
+            return False
+
+    def append(self, df, table):
+        if not self.is_table_exists(table): return False
+        #columns which are not in df are null, the same as mysql
+        meta = self.get_meta(table)
+        keys = meta.get('keys', ['date'])
+        df = df.reindex(columns = meta['columns'])
+        df = df.drop_duplicates(subset = keys, keep = 'last')
+        df = df.sort_values(by = keys, ascending = True)
+        if df.empty: return True
+        try:
+            if self.append_rows(df, table, meta): return True
+        except Exception as e:
+            logger.error("append %s for %s to data lake failed:%s" % (table, self.dbname, e))
+        #rows which are not after the stored ones or do not fit the stored types rewrite the whole table
+        old_df = self.get(table)
+        if old_df is None: return False
+        return self.set(pd.concat([old_df, df], ignore_index = True), table, keys)
+
+    @staticmethod
+    def read_header(f):
+        #returns (dtype, length, offset of data) of a .npy file
+        version = np.lib.format.read_magic(f)
+        shape, fortran_order, dtype = getattr(np.lib.format, "read_array_header_%d_0" % version[0])(f)
+        if fortran_order or len(shape) != 1: raise Exception("not a column file")
+        return version, dtype, shape[0], f.tell()
+
+    @staticmethod
+    def get_header(version, dtype, length):
+        buf = io.BytesIO()
+        getattr(np.lib.format, "write_array_header_%d_0" % version[0])(buf, {'descr': np.lib.format.dtype_to_descr(dtype), 'fortran_order': False, 'shape': (length,)})
+        return buf.getvalue()
+
+    def append_rows(self, df, table, meta):
+        #write the new rows at the end of every column file when they are all after the stored ones,
+        #the meta is written last and reads stop at its length, so a broken append is not read and is rewritten next time
+        length, nulls = meta['length'], meta.get('nulls', [])
+        dates = np.load(self.get_column_file(table, 'date'), mmap_mode = 'r')
+        if len(dates) != length: return False
+        arrays = {self.get_column_file(table, column): self.to_array(df[column], column, column in nulls) for column in meta['columns']}
+        arrays.update({self.get_null_file(table, column): df[column].isnull().values for column in nulls})
+        if length > 0 and arrays[self.get_column_file(table, 'date')][0] <= dates[-1]: return False
+        headers = dict()
+        for path, values in arrays.items():
+            with open(path, 'rb') as f:
+                version, dtype, num, offset = self.read_header(f)
+            if num != length or not np.can_cast(values.dtype, dtype, 'safe'): return False
+            header = self.get_header(version, dtype, length + len(values))
+            if len(header) != offset: return False
+            headers[path] = (header, values.astype(dtype))
+        for path, (header, values) in headers.items():
+            with open(path, 'r+b') as f:
+                f.seek(len(header) + length * values.dtype.itemsize)
+                f.write(values.tobytes())
+                f.truncate()
+                f.seek(0)
+                f.write(header)
+        meta['length'] = length + len(df)
+        meta_file = os.path.join(self.get_table_dir(table), self.META_FILE)
+        with open("%s.tmp" % meta_file, 'w') as f:
+            json.dump(meta, f)
+        os.replace("%s.tmp" % meta_file, meta_file)
+        return True
+
+    @staticmethod
+    def to_value(value, column):
+        if column != 'date': return value
+        if isinstance(value, str): return int(value.replace('-', ''))
+        return [int(item.replace('-', '')) for item in value]
+
+    def get_mask(self, table, start, end, where, nulls):
+        #rows in [start, end) which match all conditions of where, only the columns of where are read, null matches nothing
+        mask = np.ones(end - start, dtype = bool)
+        for column, operator, value in where:
+            if operator not in OPERATOR_FUNCS: raise Exception("not supported operator:%s" % operator)
+            values = np.load(self.get_column_file(table, column), mmap_mode = 'r')[start:end]
+            mask &= OPERATOR_FUNCS[operator](values, self.to_value(value, column))
+            if column in nulls: mask &= ~np.load(self.get_null_file(table, column), mmap_mode = 'r')[start:end]
+        return mask
+
+    def get(self, table, start_date = None, end_date = None, columns = None, where = None):
+        #start_date and end_date are both included, where is a list of (column, operator, value)
+        try:
+            meta = self.get_meta(table)
+            nulls = meta.get('nulls', [])
+            if columns is None: columns = meta['columns']
+            dates = np.load(self.get_column_file(table, 'date'), mmap_mode = 'r')[:meta['length']]
+            start = 0 if start_date is None else np.searchsorted(dates, int(start_date.replace('-', '')), 'left')
+            end = len(dates) if end_date is None else np.searchsorted(dates, int(end_date.replace('-', '')), 'right')
+            mask = None if where is None or len(where) == 0 else self.get_mask(table, start, end, where, nulls)
+            data = dict()
+            for column in columns:
+                values = np.load(self.get_column_file(table, column), mmap_mode = 'r')[start:end]
+                values = np.array(values) if mask is None else values[mask]
+                if column in nulls:
+                    null_mask = np.load(self.get_null_file(table, column), mmap_mode = 'r')[start:end]
+                    values = values.astype(object)
+                    values[null_mask if mask is None else null_mask[mask]] = None
+                data[column] = self.to_date_strings(values) if column == 'date' else values
+            return pd.DataFrame(data, columns = columns)
+        except Exception as e:
+            logger.error("get %s for %s from data lake failed:%s" % (table, self.dbname, e))
+            return None
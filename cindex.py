@@ -3,6 +3,8 @@ import _pickle
 import const as ct
 import pandas as pd
 from cinfluxdb import CInflux
+from cdatalake import CDataLake
+from tdx_reader import tdx_reader
 from datetime import datetime
 from base.cobj import CMysqlObj
 from base.clog import getLogger
@@ -90,18 +92,15 @@ class CIndex(CMysqlObj):
     def get_stock_day_table(self):
         return "%s_day" % self.dbname
 
-    def get_k_data_in_range(self, start_date, end_date):
+    def get_k_data_in_range(self, start_date, end_date, columns = None, where = list()):
         table_name = self.get_stock_day_table()
-        sql = "select * from %s where date between \"%s\" and \"%s\"" %(table_name, start_date, end_date)
-        return self.mysql_client.get(sql)
+        return self.mysql_client.select(table_name, columns, [('date', '>=', start_date), ('date', '<=', end_date)] + list(where))
 
-    def get_k_data(self, date = None):
+    def get_k_data(self, date = None, columns = None, where = list()):
+        #columns and where are pushed down to mysql, where is a list of (column, operator, value)
         table_name = self.get_stock_day_table()
-        if date is not None:
-            sql = "select * from %s where date=\"%s\"" % (table_name, date)
-        else:
-            sql = "select * from %s" % table_name
-        return self.mysql_client.get(sql)
+        date_where = list() if date is None else [('date', '=', date)]
+        return self.mysql_client.select(table_name, columns, date_where + list(where))
 
     def create_components_table(self, table_name):
         sql = 'create table if not exists %s(date varchar(10) not null,\
@@ -163,13 +162,10 @@ class CIndex(CMysqlObj):
     def read(self, fpath):
         prestr = "1" if self.get_market() == ct.MARKET_SH else "0"
         filename = "%s%s.csv" % (prestr, self.code)
-        dheaders = ['date', 'open', 'high', 'close', 'low', 'amount', 'volume']
-        df = pd.read_csv(fpath % filename, sep = ',', usecols = dheaders)
-        df['date'] = df['date'].astype(str)
-        df['date'] = pd.to_datetime(df.date).dt.strftime("%Y-%m-%d")
+        #the file is parsed once and cached as an array sorted by date
+        df = tdx_reader.get_frame(fpath % filename)
+        df['date'] = CDataLake.to_date_strings(df['date'].values)
         df = self.handle_unexpected_data(df)
-        df = df.reset_index(drop = True)
-        df = df.sort_values(by = 'date', ascending= True)
         return df
 
     def set_k_data(self, cdate = None, fpath = "/data/tdx/history/days/%s"):
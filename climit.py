@@ -12,7 +12,7 @@ import pandas as pd
 from cmysql import CMySQL
 from base.clog import getLogger
 from ccalendar import CCalendar
-from common import create_redis_obj, get_day_nday_ago, get_dates_array
+from common import create_redis_obj, get_day_nday_ago, get_dates_array, is_redis_member
 from datetime import datetime
 class CLimit:
     def __init__(self, dbinfo = ct.DB_INFO, redis_host = None):
@@ -137,21 +137,17 @@ class CLimit:
         return False
 
     def is_date_exists(self, table_name, cdate):
-        if self.redis.exists(table_name):
-            return cdate in set(tdate.decode() for tdate in self.redis.smembers(table_name))
-        return False
+        return is_redis_member(self.redis, table_name, cdate)
 
     def update(self, end_date = None, num = 10):
         if end_date is None: end_date = datetime.now().strftime('%Y-%m-%d')
         start_date = get_day_nday_ago(end_date, num = num, dformat = "%Y-%m-%d")
-        date_array = get_dates_array(start_date, end_date)
         succeed = True
-        for mdate in date_array:
-            if CCalendar.is_trading_day(mdate, redis = self.redis):
-                #if mdate == end_date: continue
-                if not self.crawl_data(mdate):
-                    self.logger.error("%s set failed" % mdate)
-                    succeed = False
+        for mdate in CCalendar.get_trading_days(start_date, end_date, asending = False, redis = self.redis):
+            #if mdate == end_date: continue
+            if not self.crawl_data(mdate):
+                self.logger.error("%s set failed" % mdate)
+                succeed = False
         return succeed
 
 if __name__ == '__main__':
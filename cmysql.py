@@ -1,5 +1,8 @@
 #encoding=utf-8
+import os
 import time
+import tempfile
+import threading
 import pymysql
 import sqlalchemy
 import const as ct
@@ -7,18 +10,111 @@ import pandas as pd
 import MySQLdb as db
 from base.clog import getLogger
 from common import create_redis_obj
+from collections import OrderedDict
 from warnings import filterwarnings
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 filterwarnings('error', category = db.Warning)
 ALL_DATABASES = 'all_databases'
 ALL_TRIGGERS = 'all_triggers'
 logger = getLogger(__name__)
+def to_sql_value(value):
+    return "\"%s\"" % value if isinstance(value, str) else str(value)
+
+def create_where_clause(where):
+    #where is a list of (column, operator, value), conditions are joined by and
+    items = list()
+    for column, operator, value in where:
+        if operator not in ct.WHERE_OPERATORS: raise Exception("not supported operator:%s" % operator)
+        if operator == 'in':
+            items.append("%s in (%s)" % (column, ', '.join(to_sql_value(item) for item in value)))
+        else:
+            items.append("%s %s %s" % (column, operator, to_sql_value(value)))
+    return ' and '.join(items)
+
+def create_select_query(table, columns = None, where = None):
+    fields = '*' if columns is None else ', '.join(columns)
+    if where is None or len(where) == 0: return "select %s from %s" % (fields, table)
+    return "select %s from %s where %s" % (fields, table, create_where_clause(where))
+
+class CConnectionManager:
+    #process-wide bounded pools of mysql connections keyed by (host, user, dbname),
+    #every checkout gets a connection of its own, so greenlets never share one,
+    #connections are pinged before checkout and recycled after MYSQL_POOL_RECYCLE seconds,
+    #every stock has its own database, so only the max_engines most recently used pools are kept
+    def __init__(self, pool_size = ct.MYSQL_POOL_SIZE, max_overflow = ct.MYSQL_MAX_OVERFLOW, timeout = ct.MYSQL_POOL_TIMEOUT, recycle = ct.MYSQL_POOL_RECYCLE, max_engines = ct.MYSQL_MAX_ENGINES):
+        self.pool_size = pool_size
+        self.max_overflow = max_overflow
+        self.timeout = timeout
+        self.recycle = recycle
+        self.max_engines = max_engines
+        self.lock = threading.Lock()
+        self.pid = os.getpid()
+        self.engines = OrderedDict()
+        self.stats = dict()
+        self.inherited = list()
+
+    @staticmethod
+    def get_key(dbinfo, dbname):
+        return (dbinfo['host'], dbinfo['user'], dbname)
+
+    def get_engine(self, dbinfo, dbname):
+        key = self.get_key(dbinfo, dbname)
+        with self.lock:
+            if self.pid != os.getpid():
+                #connections of the parent process can not be used in the child process,
+                #keep a reference of them so that they are not closed by gc
+                self.inherited.extend(self.engines.values())
+                self.pid, self.engines, self.stats = os.getpid(), OrderedDict(), dict()
+            if key in self.engines:
+                self.engines.move_to_end(key)
+            else:
+                engine = create_engine("mysql://%s:%s@%s/%s?charset=utf8" % (dbinfo['user'], dbinfo['password'], dbinfo['host'], dbname), pool_size = self.pool_size,
+                                       max_overflow = self.max_overflow, pool_timeout = self.timeout, pool_recycle = self.recycle, pool_pre_ping = True, connect_args = {'connect_timeout': 3, 'local_infile': 1})
+                self.stats[key] = {'checkout': 0, 'miss': 0, 'wait_time': 0.0, 'max_wait_time': 0.0}
+                event.listen(engine, 'connect', lambda dbapi_conn, conn_record, key = key: self.on_connect(key))
+                self.engines[key] = engine
+                self.evict()
+            return self.engines[key]
+
+    def evict(self):
+        #dispose the least recently used pools which have no connection checked out, so the idle connections
+        #of databases which are not used any more are closed, the newest pool is never disposed
+        for key in list(self.engines.keys())[:-1]:
+            if len(self.engines) <= self.max_engines: break
+            if self.engines[key].pool.checkedout() > 0: continue
+            self.engines.pop(key).dispose()
+            self.stats.pop(key, None)
+
+    def on_connect(self, key):
+        if key in self.stats: self.stats[key]['miss'] += 1
+
+    def connect(self, dbinfo, dbname, raw = False):
+        #raw connection is a pooled MySQLdb connection, close() gives it back to the pool
+        engine = self.get_engine(dbinfo, dbname)
+        start = time.time()
+        conn = engine.raw_connection() if raw else engine.connect()
+        wait_time = time.time() - start
+        stats = self.stats.get(self.get_key(dbinfo, dbname))
+        if stats is not None:
+            stats['checkout'] += 1
+            stats['wait_time'] += wait_time
+            stats['max_wait_time'] = max(stats['max_wait_time'], wait_time)
+        return conn
+
+    def get_stats(self):
+        stats = dict()
+        for key, value in self.stats.items():
+            stats[key] = dict(value, hit = value['checkout'] - value['miss'], size = self.engines[key].pool.checkedout())
+        return stats
+
+connection_manager = CConnectionManager()
+
 class CMySQL:
     def __init__(self, dbinfo, dbname = 'stock', iredis = None):
         self.dbinfo = dbinfo
         self.dbname = dbname
         self.redis  = create_redis_obj() if iredis is None else iredis
-        self.engine = create_engine("mysql://%s:%s@%s/%s?charset=utf8" % (self.dbinfo['user'], self.dbinfo['password'], self.dbinfo['host'], self.dbname), pool_size=0 , max_overflow=-1, pool_recycle=20, pool_timeout=5, connect_args={'connect_timeout': 3})
+        self.engine = connection_manager.get_engine(self.dbinfo, self.dbname)
 
     def __del__(self):
         self.redis = None
@@ -26,7 +122,13 @@ class CMySQL:
 
     def changedb(self, dbname = 'stock'):
         self.dbname = dbname
-        self.engine = create_engine("mysql://%s:%s@%s/%s?charset=utf8" % (self.dbinfo['user'], self.dbinfo['password'], self.dbinfo['host'], self.dbname), pool_size=0 , max_overflow=-1, pool_recycle=20, pool_timeout=5, connect_args={'connect_timeout': 3})
+        self.engine = connection_manager.get_engine(self.dbinfo, self.dbname)
+
+    def connect(self):
+        return connection_manager.connect(self.dbinfo, self.dbname)
+
+    def raw_connect(self):
+        return connection_manager.connect(self.dbinfo, self.dbname, raw = True)
 
     def get_all_databases(self):
         if self.redis.exists(ALL_DATABASES):
@@ -56,7 +158,7 @@ class CMySQL:
         res = False
         for i in range(ct.RETRY_TIMES):
             try:
-                conn = self.engine.connect()
+                conn = self.connect()
                 df = pd.read_sql(sql, conn)
                 res = True
             except sqlalchemy.exc.OperationalError as e:
@@ -85,7 +187,7 @@ class CMySQL:
         #only update entire columns
         res = True
         try:
-            conn = db.connect(host=self.dbinfo['host'],user=self.dbinfo['user'],passwd=self.dbinfo['password'],db=self.dbname,charset=ct.UTF8,connect_timeout=3)
+            conn = self.raw_connect()
             cur = conn.cursor()
             key_values = df[pri_cols].to_dict(orient = 'records')
             insert_values = df[columns].to_dict(orient = 'records')
@@ -122,10 +224,10 @@ class CMySQL:
         sql = self.create_upsert_query(table, columns, pri_keys)
         return self.executemany(sql, params = insert_items)
 
-    def delsert(self, df, table):
+    def delsert(self, df, table, bulk = False):
         if self.exec_sql("truncate table %s;" % table):
             logger.debug("delsert %s for %s", table, self.dbname)
-            return self.set(df, table)
+            return self.bulk_set(df, table) if bulk else self.set(df, table)
         else:
             logger.error("delsert %s for db %s failed", table, self.dbname)
             return False
@@ -133,7 +235,7 @@ class CMySQL:
     def executemany(self, sql, params = None):
         res = True
         try:
-            conn = db.connect(host = self.dbinfo['host'], user = self.dbinfo['user'], passwd = self.dbinfo['password'], db = self.dbname, charset = ct.UTF8, connect_timeout = 30)
+            conn = self.raw_connect()
             cur = conn.cursor()
             cur.executemany(sql, params)
             conn.commit()
@@ -166,7 +268,7 @@ class CMySQL:
         res = False
         for i in range(ct.RETRY_TIMES):
             try:
-                conn = self.engine.connect()
+                conn = self.connect()
                 data_frame.to_sql(table, conn, if_exists = ct.APPEND, index=False)
                 res = True
             except sqlalchemy.exc.OperationalError as e:
@@ -182,28 +284,125 @@ class CMySQL:
         logger.error("write to db:%s, table:%s failed afer try %d times" % (self.dbname, table, ct.RETRY_TIMES))
         return res 
 
+    def bulk_set(self, df, table):
+        #write df with LOAD DATA LOCAL INFILE, if the server refuses local infile, fall back to multi-row inserts.
+        #LOAD DATA LOCAL skips rows with duplicated keys with a warning, so the written rows are counted and
+        #a dropped row fails the write the same as a duplicated key fails the inserts
+        if df.empty: return True
+        start = time.time()
+        res = self.load_data(df, table)
+        if res is None: res = self.insert_rows(df, table)
+        if res:
+            cost = max(time.time() - start, 1e-6)
+            logger.info("bulk write %s rows to db:%s, table:%s, cost:%.2fs, speed:%.0f rows/s" % (len(df), self.dbname, table, cost, len(df) / cost))
+        else:
+            logger.error("bulk write to db:%s, table:%s failed" % (self.dbname, table))
+        return res
+
+    @staticmethod
+    def get_insert_frame(df):
+        #mysql has no bool and nan, use int and null instead
+        bool_columns = df.columns[df.dtypes == bool]
+        if len(bool_columns) > 0: df = df.astype({column: int for column in bool_columns})
+        return df
+
+    def load_data(self, df, table):
+        #returns None when the file can not be loaded, so that bulk_set falls back to inserts
+        res = None
+        df = self.get_insert_frame(df)
+        columns = ', '.join(df.columns.tolist())
+        sql = "LOAD DATA LOCAL INFILE %%s INTO TABLE %s FIELDS TERMINATED BY ',' OPTIONALLY ENCLOSED BY '\"' LINES TERMINATED BY '\\n' (%s);" % (table, columns)
+        with tempfile.NamedTemporaryFile(mode = 'w', suffix = '.csv', delete = False) as f:
+            fname = f.name
+            df.to_csv(f, index = False, header = False, na_rep = '\\N')
+        try:
+            conn = self.raw_connect()
+            cur = conn.cursor()
+            try:
+                cur.execute(sql, (fname,))
+            except db.Warning as w:
+                #the warning is raised after the statement is done, rowcount is the number of written rows
+                logger.debug("warning:%s" % str(w))
+            if cur.rowcount != len(df):
+                logger.error("load data to db:%s, table:%s dropped %s of %s rows" % (self.dbname, table, len(df) - cur.rowcount, len(df)))
+                conn.rollback()
+                res = False
+            else:
+                conn.commit()
+                res = True
+        except Exception as e:
+            logger.info("load data to db:%s, table:%s failed:%s" % (self.dbname, table, e))
+            if 'conn' in dir(): conn.rollback()
+        finally:
+            if 'cur' in dir(): cur.close()
+            if 'conn' in dir(): conn.close()
+            os.remove(fname)
+        return res
+
+    def insert_rows(self, df, table):
+        #MySQLdb rewrites executemany of insert into multi-row inserts, every statement is at most max_stmt_length bytes
+        res = False
+        df = self.get_insert_frame(df)
+        sql = "INSERT INTO %s (%s) VALUES (%s)" % (table, ', '.join(df.columns.tolist()), ', '.join(['%s'] * len(df.columns)))
+        rows = list(df.astype(object).where(df.notnull(), None).itertuples(index = False, name = None))
+        try:
+            conn = self.raw_connect()
+            cur = conn.cursor()
+            cur.execute("select @@max_allowed_packet")
+            cur.max_stmt_length = max(int(cur.fetchone()[0]) - 1024, 64 * 1024)
+            for start in range(0, len(rows), ct.MYSQL_INSERT_ROWS): self.insert_batch(cur, sql, rows[start:start + ct.MYSQL_INSERT_ROWS])
+            conn.commit()
+            res = True
+        except Exception as e:
+            logger.error("insert rows to db:%s, table:%s failed:%s" % (self.dbname, table, e))
+            if 'conn' in dir(): conn.rollback()
+        finally:
+            if 'cur' in dir(): cur.close()
+            if 'conn' in dir(): conn.close()
+        return res
+
+    @staticmethod
+    def insert_batch(cur, sql, rows):
+        #a duplicated key raises an error. a warning is raised after the statement it belongs to, a batch fits in one statement
+        #unless it is longer than max_stmt_length, then executemany stops after the first one, so the written rows are checked
+        try:
+            cur.executemany(sql, rows)
+        except db.Warning as w:
+            logger.debug("warning:%s" % str(w))
+        if cur.rowcount != len(rows): raise Exception("%s of %s rows are not written" % (len(rows) - cur.rowcount, len(rows)))
+
     def get(self, sql):
         res = False
         for i in range(ct.RETRY_TIMES):
             try:
-                conn = self.engine.connect()
+                conn = self.connect()
                 data = pd.read_sql_query(sql, conn)
                 res = True
             except sqlalchemy.exc.OperationalError as e:
                 logger.debug(e)
-                if 'conn' in dir(): conn.close()
             except Exception as e:
                 logger.error(e)
+            finally:
+                #give the connection back to the pool
                 if 'conn' in dir(): conn.close()
             if True == res: return data
         logger.error("%s %s failed afer try %d times" % (self.dbname, sql, ct.RETRY_TIMES))
         return None
 
+    def select(self, table, columns = None, where = None):
+        return self.get(create_select_query(table, columns, where))
+
+    def get_in_ranges(self, table_ranges, columns = None, where = list()):
+        #read [(table, start_date, end_date), ...] with one UNION ALL query, both dates are included
+        if len(table_ranges) == 0: return pd.DataFrame()
+        sql = " union all ".join("(%s)" % create_select_query(table, columns, [('date', '>=', start_date), ('date', '<=', end_date)] + list(where)) for table, start_date, end_date in table_ranges)
+        return self.get(sql)
+
     def exec_sql(self, sql, params = None):
         hasSucceed = False
         for i in range(ct.RETRY_TIMES):
             try:
-                conn = db.connect(host=self.dbinfo['host'],user=self.dbinfo['user'],passwd=self.dbinfo['password'],db=self.dbname,charset=ct.UTF8,connect_timeout=3)
+                conn = self.raw_connect()
                 cur = conn.cursor()
                 cur.execute(sql, params)
                 conn.commit()
@@ -280,7 +479,7 @@ class CMySQL:
 
     def create_db(self, dbname = None):
         if dbname is None: dbname = self.dbname
-        if self.redis.exists(ALL_DATABASES) and dbname in set(tdb.decode() for tdb in self.redis.smembers(ALL_DATABASES)):
+        if self.redis.sismember(ALL_DATABASES, dbname):
             return True
         res = False
         try:
@@ -9,6 +9,7 @@ from cstock import CStock
 from datetime import datetime
 from cinfluxdb import CInflux
 from base.cobj import CMysqlObj
+from base.ccache import frame_cache
 class Combination(CMysqlObj):
     def __init__(self, code, should_create_db = False, dbinfo = ct.DB_INFO, redis_host = None):
         super(Combination, self).__init__(code, self.get_dbname(code), dbinfo, redis_host)
@@ -37,13 +38,12 @@ class Combination(CMysqlObj):
 
     def compute(self):
         code_list = self.get_code_list()
-        df = pd.DataFrame()
-        for code in code_list:
-            df_byte = self.redis.get(CStock.get_redis_name(code))
-            if df_byte is None: continue
-            df = df.append(_pickle.loads(df_byte))
+        if len(code_list) == 0: return pd.DataFrame()
+        #fetch the realtime data of all stocks in one round trip
+        df_list = [_pickle.loads(df_byte) for df_byte in self.redis.mget([CStock.get_redis_name(code) for code in code_list]) if df_byte is not None]
+        if len(df_list) == 0: return pd.DataFrame()
+        df = pd.concat(df_list, sort = False)
         num = len(df)
-        if 0 == num: return pd.DataFrame()
         _price = df.price.astype(float).sum()/num
         _volume = df.volume.astype(float).sum()/num
         _amount = df.turnover.astype(float).sum()/num
@@ -54,21 +54,6 @@ class Combination(CMysqlObj):
         df = df.set_index('time')
         return df
 
-    def is_table_exists(self, table_name):
-        if self.redis.exists(self.dbname):
-            return table_name in set(table.decode() for table in self.redis.smembers(self.dbname))
-        return False
-
-    def is_date_exists(self, table_name, cdate):
-        if self.redis.exists(table_name):
-            return cdate in set(tdate.decode() for tdate in self.redis.smembers(table_name))
-        return False
-
-    def get_existed_keys_list(self, table_name):
-        if self.redis.exists(table_name):
-            return list(tdate.decode() for tdate in self.redis.smembers(table_name))
-        return list()
-
     def run(self):
         _new_data = self.compute()
         if not _new_data.empty:
@@ -76,7 +61,4 @@ class Combination(CMysqlObj):
             self.influx_client.set(_new_data)
 
     def get(self, attribute):
-        df_byte = self.redis.get(ct.COMBINATION_INFO)
-        if df_byte is None: return None
-        df = _pickle.loads(df_byte)
-        return df.loc[df.code == self.code][attribute].values[0]
+        return frame_cache.get_value(self.redis, ct.COMBINATION_INFO, 'code', self.code, attribute)
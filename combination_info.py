@@ -4,6 +4,7 @@ import cmysql
 import const as ct
 import pandas as pd
 from base.clog import getLogger
+from base.ccache import frame_cache
 from pandas import DataFrame
 from combination import Combination
 from pytdx.reader import CustomerBlockReader
@@ -35,7 +36,7 @@ class CombinationInfo:
         new_self_defined_df['best'] = '0'
         new_df = new_df.append(new_self_defined_df)
         new_df = new_df.reset_index(drop = True)
-        return self.redis.set(ct.COMBINATION_INFO, _pickle.dumps(new_df, 2))
+        return frame_cache.set(self.redis, ct.COMBINATION_INFO, new_df)
 
     def create_obj(self, code):
         try:
@@ -59,10 +60,8 @@ class CombinationInfo:
     @staticmethod
     def get(index_type = None, redis = None):
         redis = create_redis_obj() if redis is None else redis
-        df_byte = redis.get(ct.COMBINATION_INFO) 
-        if df_byte is None: return pd.DataFrame() 
-        df = _pickle.loads(df_byte)
-        if index_type is None: return df
+        df = frame_cache.get(redis, ct.COMBINATION_INFO)
+        if df.empty or index_type is None: return df
         return df[[df.cType == index_type]]
 
     def get_concerned_list(self):
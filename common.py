@@ -14,8 +14,9 @@ import pandas as pd
 import tushare as ts
 from base.credis import CRedis
 from base.clog import getLogger
+from base.cscheduler import CTaskScheduler
 from gevent.pool import Pool
-from multiprocessing import Process, Queue
+from functools import partial
 from datetime import datetime, timedelta
 logger = getLogger(__name__)
 
@@ -95,6 +96,19 @@ def get_day_nday_ago(date, num, dformat = "%Y%m%d"):
     _date = datetime(y, m, d) - timedelta(num)
     return _date.strftime(dformat)
 
+QUARTER_END_DAYS = {1: '03-31', 2: '06-30', 3: '09-30', 4: '12-31'}
+def get_quarter_ranges(start_date, end_date, get_table_name):
+    #[(table, start, end), ...] of every quarter table touched by [start_date, end_date], computed from the bounds only
+    ranges = list()
+    year, quarter = int(start_date[0:4]), (int(start_date[5:7]) - 1) // 3 + 1
+    while True:
+        qstart = max(start_date, "%04d-%02d-01" % (year, 3 * quarter - 2))
+        qend = min(end_date, "%04d-%s" % (year, QUARTER_END_DAYS[quarter]))
+        if qstart > qend: break
+        ranges.append((get_table_name(qstart), qstart, qend))
+        year, quarter = (year + 1, 1) if quarter == 4 else (year, quarter + 1)
+    return ranges
+
 def is_trading_time(now_time = None):
     if now_time is None:now_time = datetime.now()
     _date = now_time.strftime('%Y-%m-%d')
@@ -235,6 +249,10 @@ def loads_jsonp(_jsonp):
 def remove_blacklist(redis_client, key, black_list):
     if len(black_list) > 0: redis_client.srem(key, *set(black_list))
 
+def is_redis_member(redis_client, key, member):
+    #one SISMEMBER instead of transferring the whole set, a missing key is an empty set
+    return bool(redis_client.sismember(key, member))
+
 def get_unfinished_workers(redis_client, key):
     return list(set(code.decode() for code in redis_client.smembers(key)))
 
@@ -246,82 +264,41 @@ def init_unfinished_workers(redis_client, key, todo_list, overwrite = False):
         if not redis_client.exists(key):
             redis_client.sadd(key, *set(todo_list))
 
-def queue_process_concurrent_run(mfunc, all_list, redis_client = None, process_num = 2, num = 10, black_list = []):
+def queue_process_concurrent_run(mfunc, all_list, redis_client = None, process_num = ct.TASK_PROCESS_NUM, num = 10, black_list = [], batch_rows = ct.TASK_BATCH_ROWS):
+    #mfunc returns (code, df), workers save the frames as record batches and the parent concatenates them once
     if redis_client is None: redis_client = create_redis_obj()
     init_unfinished_workers(redis_client, ct.UNFINISHED_QUEUE_WORKS, copy.deepcopy(all_list), overwrite = True)
+    if len(black_list) > 0: remove_blacklist(redis_client, ct.UNFINISHED_QUEUE_WORKS, black_list)
     todo_list = get_unfinished_workers(redis_client, ct.UNFINISHED_QUEUE_WORKS)
     logger.info("all queue code list length:%s", len(todo_list))
     if len(todo_list) == 0: return None
-    last_length = len(todo_list)
-    q = Queue(last_length)
-    all_df = pd.DataFrame()
-    while last_length > 0:
-        i_start = 0
-        jobs = list()
-        av_num = max(int(last_length / process_num), process_num)
-        for x in range(process_num):
-            i_end = min(i_start + av_num, last_length)
-            p = Process(target = queue_thread_concurrent_run, args=(mfunc, todo_list[i_start:i_end], redis_client, ct.UNFINISHED_QUEUE_WORKS, q), kwargs={'num': num})
-            jobs.append(p)
-            i_start = i_end
-
-        for j in jobs: j.start()
-
-        #for j in jobs: j.join()
-        liveprocs = jobs
-        while liveprocs:
-            while not q.empty():
-                all_df = all_df.append(q.get(False))
-            time.sleep(0.1)    # Give tasks a chance to put more data in
-            liveprocs = [p for p in jobs if p.is_alive()]
-
-        if len(black_list) > 0: remove_blacklist(redis_client, ct.UNFINISHED_QUEUE_WORKS, black_list)
-        todo_list = get_unfinished_workers(redis_client, ct.UNFINISHED_QUEUE_WORKS)
-        if len(todo_list) == last_length:
-            logger.error("left todo list:%s" % todo_list)
-            time.sleep(100)
-            return None
-        else:
-            last_length = len(todo_list)
-    return all_df 
-
-def queue_thread_concurrent_run(mfunc, todo_list, redis_client, key, q, num = 10):
-    obj_pool = Pool(num)
-    if 0 == len(todo_list): sys.exit(True)
-    for result in obj_pool.imap_unordered(mfunc, todo_list):
-        if result[1] is not None: 
-            tem_df = result[1]
-            tem_df['code'] = result[0]
-            q.put(tem_df)
-            redis_client.srem(key, result[0])
-    sys.exit(True)
+    scheduler = CTaskScheduler(partial(get_queue_result, mfunc), process_num = process_num, num = num, redis_client = redis_client,
+                               key = ct.UNFINISHED_QUEUE_WORKS, dead_key = ct.DEAD_LETTER_QUEUE_WORKS, batch_rows = batch_rows)
+    dead_list = scheduler.run(todo_list)
+    if len(dead_list) > 0:
+        logger.error("left todo list:%s" % dead_list)
+        scheduler.cleanup()
+        return None
+    return scheduler.collect()
+
+def get_queue_result(mfunc, item):
+    code, tem_df = mfunc(item)
+    if tem_df is not None: tem_df['code'] = code
+    return (code, tem_df)
 
-def process_concurrent_run(mfunc, all_list, redis_client = None, process_num = 2, num = 10, black_list = ct.BLACK_LIST):
+def process_concurrent_run(mfunc, all_list, redis_client = None, process_num = ct.TASK_PROCESS_NUM, num = 10, black_list = ct.BLACK_LIST):
+    #every process runs num greenlets, so the tasks run at most process_num * num at a time
     if redis_client is None: redis_client = create_redis_obj()
     init_unfinished_workers(redis_client, ct.UNFINISHED_WORKS, copy.deepcopy(all_list))
+    if len(black_list) > 0: remove_blacklist(redis_client, ct.UNFINISHED_WORKS, black_list)
     todo_list = get_unfinished_workers(redis_client, ct.UNFINISHED_WORKS)
     logger.info("all code list length:%s", len(todo_list))
     if len(todo_list) == 0: return False
-    last_length = len(todo_list)
-    while last_length > 0:
-        i_start = 0
-        jobs = list()
-        av_num = max(int(last_length / process_num), process_num)
-        for x in range(process_num):
-            i_end = min(i_start + av_num, last_length)
-            p = Process(target = thread_concurrent_run, args=(mfunc, todo_list[i_start:i_end], redis_client, ct.UNFINISHED_WORKS), kwargs={'num': num})
-            jobs.append(p)
-            i_start = i_end
-        for j in jobs: j.start()
-        for j in jobs: j.join()
-        if len(black_list) > 0: remove_blacklist(redis_client, ct.UNFINISHED_WORKS, black_list)
-        todo_list = get_unfinished_workers(redis_client, ct.UNFINISHED_WORKS)
-        if len(todo_list) == last_length:
-            time.sleep(300)
-            logger.error("left todo list:%s" % todo_list)
-            return False
-        else:
-            last_length = len(todo_list)
+    scheduler = CTaskScheduler(mfunc, process_num = process_num, num = num, redis_client = redis_client, key = ct.UNFINISHED_WORKS)
+    dead_list = scheduler.run(todo_list)
+    if len(dead_list) > 0:
+        logger.error("left todo list:%s" % dead_list)
+        return False
     return True
 
 def thread_concurrent_run(mfunc, todo_list, redis_client, key, num = 10):
@@ -72,6 +72,23 @@ const.IN_DB_INFO = {'user': 'root',
 const.UTF8 = "utf8"
 const.SQL = "select * from %s"
 const.RETRY_TIMES = 1
+const.MYSQL_POOL_SIZE = 10
+const.MYSQL_MAX_OVERFLOW = 20
+const.MYSQL_POOL_TIMEOUT = 30
+const.MYSQL_POOL_RECYCLE = 3600
+#pools of databases kept by a process, the least recently used idle one is disposed
+const.MYSQL_MAX_ENGINES = 16
+#rows of a multi-row insert of the bulk writer
+const.MYSQL_INSERT_ROWS = 1000
+##############################
+#operators of where conditions which are pushed down to mysql and data lake, a condition is (column, operator, value)
+const.WHERE_OPERATORS = ('=', '!=', '<', '<=', '>', '>=', 'in')
+#covering index of rindex stock tables for the cross-section scans of selecters
+const.RINDEX_COVERING_INDEX = 'date_profit'
+const.RINDEX_COVERING_COLUMNS = ['date', 'profit', 'npercent', 'ppercent', 'pday']
+#rindex stock tables which are checked to have the covering index
+const.RINDEX_INDEXED_TABLES = 'RINDEX_INDEXED_TABLES'
+##############################
 const.START_DATE = '2014-01-01'
 const.INDEX_DICT = {'000001':'上证指数', 
                     '000016':'上证50',
@@ -4447,8 +4464,28 @@ const.TODAY_ALL_INDUSTRY = "TODAY_ALL_INDUSTRY"
 ##################################################
 const.UNFINISHED_WORKS = "UNFINISHED_WORKS"
 const.UNFINISHED_QUEUE_WORKS = "UNFINISHED_QUEUE_WORKS"
+const.DEAD_LETTER_WORKS = "DEAD_LETTER_WORKS"
+const.DEAD_LETTER_QUEUE_WORKS = "DEAD_LETTER_QUEUE_WORKS"
+#worker processes of a scheduler, every process runs num greenlets
+const.TASK_PROCESS_NUM = 2
+const.TASK_TIMEOUT = 1800
+const.TASK_RETRY_TIMES = 3
+const.TASK_BACKOFF = 5
+#seconds after the timeout of a task before its worker is killed
+const.TASK_KILL_GRACE = 60
+const.TASK_BATCH_ROWS = 50000
+const.PIPELINE_QUEUE_SIZE = 20
+const.PIPELINE_REPORT_INTERVAL = 60
 ##################################################
 const.CHIP_COLUMNS = ['pos', 'sdate', 'date', 'price', 'volume', 'outstanding']
+const.CHIP_CHECKPOINT_DIR = "/data/chip"
+const.RIGHT_INFO_DIR = "/data/rightinfo"
+const.TDX_CACHE_DIR = "/data/tdx/cache"
+const.TDX_CACHE_SIZE = 256
+const.TICK_INDEX_CACHE_SIZE = 16
+##################################################
+const.USE_DATA_LAKE = True
+const.DATA_LAKE_DIR = "/data/lake"
 ##################################################
 const.RESUME = 0 
 const.PAPER_TRADING = 1
@@ -0,0 +1,59 @@
+#coding=utf-8
+import sys
+import time
+from os.path import abspath, dirname
+import numpy as np
+import pandas as pd
+from pandas.testing import assert_frame_equal
+from cchip import compute_distribution, compute_distribution_legacy, mac, mac_multi
+def generate_stock_data(num = 6000, seed = 0):
+    #fake a stock which has num trading days, the outstanding changes about every 500 days
+    rs = np.random.RandomState(seed)
+    dates = pd.bdate_range('1995-01-02', periods = num).strftime('%Y-%m-%d')
+    close = 10 * np.exp(np.cumsum(rs.normal(0, 0.02, num)))
+    outstanding = 100000000 * np.cumprod(np.where(rs.rand(num) < 0.002, 1.3, 1.0))
+    outstanding = outstanding.astype(int)
+    volume = (outstanding * rs.uniform(0.002, 0.06, num)).astype(int)
+    aprice = close * rs.uniform(0.98, 1.02, num)
+    return pd.DataFrame({'date': dates, 'open': close * rs.uniform(0.97, 1.03, num), 'aprice': aprice, 'outstanding': outstanding, 'volume': volume, 'amount': aprice * volume})
+
+def load_stock_data(code):
+    #real data of a stock, same as the pipeline of CStock.set_all_data
+    sys.path.insert(0, dirname(dirname(abspath(__file__))))
+    from cindex import CIndex
+    from cstock import CStock
+    cstock = CStock(code)
+    index_info = CIndex('000001').get_k_data()
+    bonus_info = pd.read_csv("/data/tdx/base/bonus.csv", sep = ',', dtype = {'code' : str, 'market': int, 'type': int, 'money': float, 'price': float, 'count': float, 'rate': float, 'date': int})
+    quantity_change_info, price_change_info = cstock.collect_right_info(bonus_info)
+    df, _ = cstock.read()
+    df = cstock.adjust_share(df, quantity_change_info)
+    df = cstock.qfq(df, price_change_info)
+    df = cstock.transfer2adjusted(df)
+    return cstock.relative_index_strength(df, index_info)
+
+def timeit(func, *args):
+    start = time.time()
+    result = func(*args)
+    return result, time.time() - start
+
+def benchmark_distribution(num):
+    data = generate_stock_data(num)
+    new_df, new_time = timeit(compute_distribution, data)
+    old_df, old_time = timeit(compute_distribution_legacy, data.copy())
+    assert_frame_equal(new_df, old_df)
+    print("compute_distribution days:%s, rows:%s, legacy:%.2fs, new:%.2fs, speedup:%.1fx" % (num, len(new_df), old_time, new_time, old_time / new_time))
+
+def benchmark_mac(data, perieds = [0, 5, 13, 37]):
+    dist_data = compute_distribution(data)
+    olds, old_time = timeit(lambda: [mac(dist_data, peried) for peried in perieds])
+    news, new_time = timeit(mac_multi, dist_data, perieds)
+    for old, new in zip(olds, news): assert np.array_equal(np.array(old), new)
+    print("mac days:%s, rows:%s, legacy:%.2fs, new:%.2fs, speedup:%.1fx" % (len(data), len(dist_data), old_time, new_time, old_time / new_time))
+
+if __name__ == '__main__':
+    #usage: python benchmark.py [days] [code], mac is timed on the real data of code when it is given
+    num = int(sys.argv[1]) if len(sys.argv) > 1 else 6000
+    data = load_stock_data(sys.argv[2]) if len(sys.argv) > 2 else generate_stock_data(num)
+    benchmark_mac(data)
+    benchmark_distribution(num)
@@ -148,7 +148,136 @@ def compute_oneday_distribution(pre_date_dist, char *cdate, long pos, long volum
     df.price = df.price.astype(float).round(2)
     return df.reset_index(drop = True)
 
+cdef class ChipBuffer:
+    #struct of arrays for the chips alive on the current day
+    cdef public np.ndarray pos, price, volume
+    cdef public long size
+    def __init__(self, long capacity):
+        self.pos    = np.zeros(capacity, dtype = long)
+        self.price  = np.zeros(capacity, dtype = np.float32)
+        self.volume = np.zeros(capacity, dtype = long)
+        self.size   = 0
+
+def reserve(np.ndarray arr, long size):
+    if size <= len(arr): return arr
+    cdef np.ndarray narr = np.zeros(max(size, 2 * len(arr)), dtype = arr.dtype)
+    narr[:len(arr)] = arr
+    return narr
+
+def distribute_chips(np.ndarray[long] volumes, np.ndarray[float] aprices, np.ndarray[long] outstandings, float open_price):
+    #chips of all days are stored in flat (pos, price, volume, day) buffers,
+    #the chips of day i are in [offsets[i], offsets[i + 1])
+    cdef long num = len(volumes)
+    cdef long index, i, k, n, m, volume, outstanding, pre_outstanding = 0, total = 0
+    cdef long s_p_num, s_u_num, l_p_num, l_u_num
+    cdef long s_p_volume_total, s_u_volume_total, l_p_volume_total, l_u_volume_total
+    cdef long s_p_volume, s_u_volume, l_p_volume, l_u_volume
+    cdef long s_p_start, s_u_start, l_p_start, l_u_start
+    cdef float aprice, cprice
+    cdef ChipBuffer cur = ChipBuffer(num + 2), nxt = ChipBuffer(num + 2)
+    cdef np.ndarray[long] cur_pos, cur_volume, nxt_pos, nxt_volume
+    cdef np.ndarray[float] cur_price, nxt_price
+    cdef np.ndarray[long] offsets = np.zeros(num + 1, dtype = long)
+    cdef np.ndarray out_pos = np.zeros(4 * num + 2, dtype = long)
+    cdef np.ndarray out_price = np.zeros(4 * num + 2, dtype = np.float32)
+    cdef np.ndarray out_volume = np.zeros(4 * num + 2, dtype = long)
+    cdef np.ndarray out_day = np.zeros(4 * num + 2, dtype = long)
+    for index in range(num):
+        volume, aprice, outstanding = volumes[index], aprices[index], outstandings[index]
+        cur_pos, cur_price, cur_volume = cur.pos, cur.price, cur.volume
+        if 0 == index:
+            cur_pos[0], cur_price[0], cur_volume[0] = index, aprice, volume
+            cur_pos[1], cur_price[1], cur_volume[1] = index, open_price, outstanding - volume
+            n = 2
+        else:
+            n = cur.size
+            if pre_outstanding != outstanding:
+                cur_volume[:n] = evenly_distributed_chip(cur_volume[:n], pre_outstanding, outstanding)
+            #count the chips of short profit, short unprofit, long profit and long unprofit
+            s_p_num = s_u_num = l_p_num = l_u_num = 0
+            s_p_volume_total = s_u_volume_total = l_p_volume_total = l_u_volume_total = 0
+            for i in range(n):
+                cprice = cur_price[i]
+                if index - cur_pos[i] <= 60:
+                    if cprice <= aprice:
+                        s_p_num += 1
+                        s_p_volume_total += cur_volume[i]
+                    elif cprice > aprice:
+                        s_u_num += 1
+                        s_u_volume_total += cur_volume[i]
+                else:
+                    if cprice <= aprice:
+                        l_p_num += 1
+                        l_p_volume_total += cur_volume[i]
+                    elif cprice > aprice:
+                        l_u_num += 1
+                        l_u_volume_total += cur_volume[i]
+            #stable partition into the other buffer, the order of groups must be kept for the allocation
+            s_p_start, s_u_start = 0, s_p_num
+            l_p_start, l_u_start = s_p_num + s_u_num, s_p_num + s_u_num + l_p_num
+            nxt_pos, nxt_price, nxt_volume = nxt.pos, nxt.price, nxt.volume
+            for i in range(n):
+                cprice = cur_price[i]
+                if index - cur_pos[i] <= 60:
+                    if cprice <= aprice:
+                        k = s_p_start
+                        s_p_start += 1
+                    elif cprice > aprice:
+                        k = s_u_start
+                        s_u_start += 1
+                    else:
+                        continue
+                else:
+                    if cprice <= aprice:
+                        k = l_p_start
+                        l_p_start += 1
+                    elif cprice > aprice:
+                        k = l_u_start
+                        l_u_start += 1
+                    else:
+                        continue
+                nxt_pos[k], nxt_price[k], nxt_volume[k] = cur_pos[i], cprice, cur_volume[i]
+            n = s_p_num + s_u_num + l_p_num + l_u_num
+            s_p_volume, s_u_volume, l_p_volume, l_u_volume = divide_volume(volume, s_p_volume_total, s_u_volume_total, l_p_volume_total, l_u_volume_total, outstanding)
+            s_p_start, s_u_start = 0, s_p_num
+            l_p_start, l_u_start = s_p_num + s_u_num, s_p_num + s_u_num + l_p_num
+            if s_p_volume > 0: nxt.volume[s_p_start:s_u_start] = divide_according_price(nxt.price[s_p_start:s_u_start], nxt.volume[s_p_start:s_u_start], s_p_volume, aprice)
+            if s_u_volume > 0: nxt.volume[s_u_start:l_p_start] = divide_according_position(nxt.pos[s_u_start:l_p_start], nxt.volume[s_u_start:l_p_start], s_u_volume, index)
+            if l_p_volume > 0: nxt.volume[l_p_start:l_u_start] = divide_according_price(nxt.price[l_p_start:l_u_start], nxt.volume[l_p_start:l_u_start], l_p_volume, aprice)
+            if l_u_volume > 0: nxt.volume[l_u_start:n] = divide_according_position(nxt.pos[l_u_start:n], nxt.volume[l_u_start:n], l_u_volume, index)
+            nxt_pos[n], nxt_price[n], nxt_volume[n] = index, aprice, volume
+            n += 1
+            cur, nxt = nxt, cur
+            cur_pos, cur_price, cur_volume = cur.pos, cur.price, cur.volume
+        pre_outstanding = outstanding
+        #in-place compaction of the chips which have no volume
+        m = 0
+        for i in range(n):
+            if cur_volume[i] > 0:
+                if m != i: cur_pos[m], cur_price[m], cur_volume[m] = cur_pos[i], cur_price[i], cur_volume[i]
+                m += 1
+        cur.size = m
+        #emit snapshot
+        out_pos, out_price, out_volume, out_day = reserve(out_pos, total + m), reserve(out_price, total + m), reserve(out_volume, total + m), reserve(out_day, total + m)
+        out_pos[total:total + m] = cur_pos[:m]
+        out_price[total:total + m] = cur_price[:m]
+        out_volume[total:total + m] = cur_volume[:m]
+        out_day[total:total + m] = index
+        offsets[index] = total
+        total += m
+    offsets[num] = total
+    return out_pos[:total], out_price[:total], out_volume[:total], out_day[:total], offsets
+
 def compute_distribution(data):
+    cdef float open_price = data.at[0, 'open']
+    cdef np.ndarray dates = data['date'].values.astype(str).astype(object)
+    cdef np.ndarray outstandings = data['outstanding'].values.astype(long)
+    pos, price, volume, day, _ = distribute_chips(data['volume'].values.astype(long), data['aprice'].values.astype(np.float32), outstandings, open_price)
+    df = DataFrame({'pos': pos, 'sdate': dates[pos], 'date': dates[day], 'price': price, 'volume': volume, 'outstanding': outstandings[day]}, columns = CHIP_COLUMNS)
+    df.price = df.price.astype(float).round(2)
+    return df
+
+def compute_distribution_legacy(data):
     cdef char *cdate
     cdef float aprice, open_price = data.at[0, 'open']
     cdef long pos, volume, index, outstanding, pre_outstanding = 0
@@ -190,6 +319,27 @@ def mac(data, int peried):
         ulist.append(total_amount / total_volume)
     return ulist
 
+def mac_multi(data, perieds):
+    #sort once by date and by (date, pos desc), walk every date group once for all perieds,
+    #the rows of a group are summed in the same order as mac to get exactly the same result
+    cdef long i, j, start, end, peried, num
+    cdef np.ndarray dates, codes, order, pos_order, offsets, prices, volumes, index
+    dates, codes = np.unique(data['date'].values, return_inverse = True)
+    num = len(dates)
+    order = np.argsort(codes, kind = 'stable')
+    pos_order = np.lexsort((-data['pos'].values, codes))
+    offsets = np.zeros(num + 1, dtype = long)
+    offsets[1:] = np.cumsum(np.bincount(codes, minlength = num))
+    prices = data['price'].values
+    volumes = data['volume'].values
+    results = [np.zeros(num, dtype = float) for peried in perieds]
+    for i in range(num):
+        start, end = offsets[i], offsets[i + 1]
+        for j, peried in enumerate(perieds):
+            index = pos_order[start:start + peried] if peried != 0 and end - start > peried else order[start:end]
+            results[j][i] = prices[index].dot(volumes[index]) / volumes[index].sum()
+    return tuple(results)
+
 def mac1(data, perieds):
     cdef int peried
     cdef str ndate
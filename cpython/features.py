@@ -157,20 +157,31 @@ def base_floating_profit(df, mdate = None):
 
 def pro_nei_chip(df, dist_data, preday_df = None, mdate = None):
     if mdate is None:
-        p_profit_vol_list = list()
-        p_neighbor_vol_list = list()
-        groups = dist_data.groupby(dist_data.date)
-        for _index, cdate in df.date.iteritems():
-            drow = df.loc[_index]
-            close_price = drow['close']
-            outstanding = drow['outstanding']
-            group = groups.get_group(cdate)
-            p_val = 100 * group[group.price < close_price].volume.sum() / outstanding
-            n_val = 100 * group[(group.price < close_price * 1.075) & (group.price > close_price * 0.925)].volume.sum() / outstanding
-            p_profit_vol_list.append(p_val)
-            p_neighbor_vol_list.append(n_val)
-        df['ppercent'] = p_profit_vol_list
-        df['npercent'] = p_neighbor_vol_list
+        #sort the chips of every day by price once, the volume in a price range is a difference of prefix sums
+        dates, codes = np.unique(dist_data['date'].values, return_inverse = True)
+        order = np.lexsort((dist_data['price'].values, codes))
+        prices = dist_data['price'].values[order]
+        cum_volumes = np.zeros(len(order) + 1, dtype = np.int64)
+        cum_volumes[1:] = np.cumsum(dist_data['volume'].values[order])
+        offsets = np.zeros(len(dates) + 1, dtype = np.int64)
+        offsets[1:] = np.cumsum(np.bincount(codes, minlength = len(dates)))
+        day_dates = df['date'].values
+        #a day without chips is a gap of the data, it fails the same as get_group of the day
+        missing = ~np.isin(day_dates, dates)
+        if missing.any(): raise KeyError("no chip distribution of date %s" % day_dates[missing][0])
+        day_codes = np.searchsorted(dates, day_dates)
+        closes = df['close'].values
+        p_volumes = np.zeros(len(df), dtype = np.int64)
+        n_volumes = np.zeros(len(df), dtype = np.int64)
+        for i in range(len(df)):
+            start, end = offsets[day_codes[i]], offsets[day_codes[i] + 1]
+            close_price = closes[i]
+            p_volumes[i] = cum_volumes[start + np.searchsorted(prices[start:end], close_price, 'left')] - cum_volumes[start]
+            low_index = start + np.searchsorted(prices[start:end], close_price * 0.925, 'right')
+            high_index = start + np.searchsorted(prices[start:end], close_price * 1.075, 'left')
+            if high_index > low_index: n_volumes[i] = cum_volumes[high_index] - cum_volumes[low_index]
+        df['ppercent'] = 100 * p_volumes / df['outstanding'].values
+        df['npercent'] = 100 * n_volumes / df['outstanding'].values
         df['gamekline'] = df['ppercent'] - df['ppercent'].shift(1)
         df.at[0, 'gamekline'] = df.loc[0, 'ppercent']
     else:
@@ -7,10 +7,14 @@ import time
 import _pickle
 import datetime
 import const as ct
+import numpy as np
 import pandas as pd
 import tushare as ts
 from ticks import read_tick
 from cinfluxdb import CInflux
+from cdatalake import CDataLake
+from right_info import CRightInfo
+from tdx_reader import tdx_reader
 from datetime import datetime
 from functools import partial
 #from cpython.cstock import pro_nei_chip
@@ -19,21 +23,61 @@ from functools import partial
 #from cpython.mchip import compute_distribution, compute_oneday_distribution
 from base.clog import getLogger 
 from base.cobj import CMysqlObj
-from cpython.cchip import compute_distribution, compute_oneday_distribution, mac
+from base.ccache import frame_cache
+from cpython.cchip import compute_distribution, compute_oneday_distribution, mac_multi
 from cpython.cstock import compute_profit,base_floating_profit,pro_nei_chip
 from common import create_redis_obj, get_years_between, transfer_date_string_to_int, transfer_int_to_date_string, is_df_has_unexpected_data, concurrent_run
 pd.set_option('display.max_columns', None)
 pd.set_option('display.max_rows', None)
 logger = getLogger(__name__)
+def get_adjust_factors(dates, precloses, info):
+    #forward adjust factor of every row, dates are sorted. an event multiplies the rows before its date by
+    #(preclose * 10 - money + rate * price) / ((10 + rate + count) * preclose), preclose is of the last day on or before the event
+    factors = np.ones(len(dates) + 1)
+    if len(info) == 0 or len(dates) == 0: return factors[1:]
+    event_dates = info.date.values
+    start_indexes = np.searchsorted(dates, event_dates, 'right') - 1
+    valid = start_indexes >= 0
+    start_indexes, event_dates = start_indexes[valid], event_dates[valid]
+    preclose = precloses[start_indexes]
+    adj = (preclose * 10 - info.money.values[valid] + info.rate.values[valid] * info.price.values[valid]) / ((10 + info.rate.values[valid] + info['count'].values[valid]) * preclose)
+    #rows before cut are adjusted, the day of the event itself is not adjusted when it is a trading day
+    cuts = np.where(dates[start_indexes] == event_dates, start_indexes, start_indexes + 1)
+    np.multiply.at(factors, cuts, adj)
+    return np.cumprod(factors[::-1])[::-1][1:]
+
+def to_int_dates(dates):
+    #YYYY-MM-DD strings to int YYYYMMDD
+    return np.array([int(str(cdate).replace('-', '')) for cdate in dates], dtype = np.int64)
+
+def get_index_info(index_info, dates):
+    #index_info is the index frame or a CRightInfo, the rows of a CRightInfo in the dates of the stock are looked up in the worker
+    if not isinstance(index_info, CRightInfo): return index_info
+    dates = to_int_dates(dates)
+    start_date, end_date = ["%04d-%02d-%02d" % (cdate // 10000, cdate // 100 % 100, cdate % 100) for cdate in (dates.min(), dates.max())]
+    return index_info.get_index(start_date, end_date)
+
+index_changes = None
+def get_index_changes(index_df):
+    #sorted int dates and pchange of the index, rebuilt only when the index frame changes
+    global index_changes
+    if index_changes is None or index_changes[0] is not index_df:
+        pchanges = ((index_df['close'] - index_df['preclose']) / index_df['preclose']).values
+        dates, first_indexes = np.unique(to_int_dates(index_df.date.values), return_index = True)
+        index_changes = (index_df, dates, pchanges[first_indexes])
+    return index_changes[1], index_changes[2]
+
 class CStock(CMysqlObj):
     def __init__(self, code, dbinfo = ct.DB_INFO, should_create_influxdb = False, should_create_mysqldb = False, redis_host = None):
         super(CStock, self).__init__(code, self.get_dbname(code), dbinfo, redis_host)
         self.influx_client  = CInflux(ct.IN_DB_INFO, dbname = self.dbname, iredis = self.redis)
+        self.lake           = CDataLake(self.dbname) if ct.USE_DATA_LAKE else None
         if not self.create(should_create_influxdb, should_create_mysqldb):
             raise Exception("create stock %s table failed" % self.code)
 
     def __del__(self):
         self.influx_client = None
+        self.lake = None
 
     @staticmethod
     def get_dbname(code):
@@ -43,69 +87,32 @@ class CStock(CMysqlObj):
     def get_redis_name(code):
         return "realtime_s%s" % code
 
-    def adjust_share(self, data, info):
+    @staticmethod
+    def adjust_share(data, info):
+        #row i before the last event takes the current shares of the first event whose last day before it is after i,
+        #the other rows take the shares after the last event
         data['outstanding'] = 0
         data['totals'] = 0
         if 0 == len(info): return pd.DataFrame()
-        cur_totals = 0
-        cur_outstanding = 0
-        next_totals = 0
-        next_outstanding = 0
-        start_index = 0
-        for info_index, end_date in info.date.iteritems():
-            cur_outstanding = int(info.at[info_index, 'money'])  #当前流通盘
-            cur_totals = int(info.at[info_index, 'price'])       #当前总股本
-            next_outstanding = int(info.at[info_index, 'count']) #后流通盘
-            next_totals = int(info.at[info_index, 'rate'])       #后总股本
-
-            dates = data.loc[data.date < end_date].index.tolist()
-            if len(dates) == 0:
-                if info_index == len(info) - 1:
-                    data.at[start_index:, 'outstanding'] = next_outstanding
-                    data.at[start_index:, 'totals'] = next_totals
-                continue
-
-            end_index = dates[len(dates) - 1]
-            #if cur_outstanding != last_pre_outstanding:
-            #   logger.debug("%s 日期:%s 前流通盘:%s 不等于 预期前流通盘:%s" % (self.code, start_date, cur_outstanding, last_pre_outstanding))
-            #elif cur_totals != last_pre_totals:
-            #   logger.debug("%s 日期:%s 后流通盘:%s 不等于 预期后流通盘:%s" % (self.code, start_date, cur_totals, last_pre_totals))
-            data.at[start_index:end_index - 1, 'outstanding'] = cur_outstanding
-            data.at[start_index:end_index - 1, 'totals'] = cur_totals
-            cur_outstanding = next_outstanding
-            cur_totals = next_totals
-            start_index = end_index
-
-            #finish the last date
-            if info_index == len(info) - 1:
-                data.at[start_index:, 'outstanding'] = cur_outstanding
-                data.at[start_index:, 'totals'] = cur_totals
-
-        data['totals']      = data['totals'].astype(int)
-        data['totals']      = data['totals'] * 10000
-        data['outstanding'] = data['outstanding'].astype(int)
-        data['outstanding'] = data['outstanding'] * 10000
+        end_indexes = np.searchsorted(data.date.values, info.date.values, 'left') - 1
+        valid = end_indexes >= 0
+        positions = np.searchsorted(end_indexes[valid], np.arange(len(data)), 'right')
+        #append the shares after the last event, so positions after all events take them
+        outstandings = np.append(info.money.values[valid].astype(np.int64), int(info['count'].values[-1])) #当前流通盘, 后流通盘
+        totals = np.append(info.price.values[valid].astype(np.int64), int(info.rate.values[-1]))           #当前总股本, 后总股本
+        data['outstanding'] = outstandings[positions] * 10000
+        data['totals'] = totals[positions] * 10000
         data = data[data.volume < data.outstanding]
         data = data.reset_index(drop = True)
         return data
 
-    def qfq(self, data, info):
+    @staticmethod
+    def qfq(data, info):
+        #adj of a row is the product of the factors of the events after it, it is always rebuilt from all events
         data['adj'] = 1.0
         data['preclose'] = data['close'].shift(1)
         data.at[0, 'preclose'] = data.loc[0, 'open']
-        for info_index, start_date in info.date.iteritems():
-            dates = data.loc[data.date <= start_date].index.tolist()
-            if len(dates) == 0 : continue
-            rate  = info.loc[info_index, 'rate']    #配k股
-            price = info.loc[info_index, 'price']   #配股价格
-            money = info.loc[info_index, 'money']   #分红
-            count = info.loc[info_index, 'count']   #转送股数量
-            start_index = dates[len(dates) - 1]
-            adj = (data.loc[start_index, 'preclose'] * 10 - money + rate * price) / ((10 + rate + count) * data.loc[start_index, 'preclose'])
-            if start_date == data['date'][start_index]:
-                data.at[:start_index - 1, 'adj'] = data.loc[:start_index - 1, 'adj'] * adj
-            else:
-                data.at[:start_index, 'adj'] = data.loc[:start_index, 'adj'] * adj
+        data['adj'] = get_adjust_factors(data.date.values, data.preclose.values, info)
         return data
 
     def has_on_market(self, cdate):
@@ -170,38 +177,24 @@ class CStock(CMysqlObj):
         return True
 
     def get(self, attribute):
-        df_byte = self.redis.get(ct.STOCK_INFO)
-        if df_byte is None: return None
-        df = _pickle.loads(df_byte)
-        if len(df.loc[df.code == self.code][attribute].values) == 0: return None
-        return df.loc[df.code == self.code][attribute].values[0]
+        return frame_cache.get_value(self.redis, ct.STOCK_INFO, 'code', self.code, attribute)
 
     def run(self, data):
         self.redis.set(self.get_redis_name(self.code), _pickle.dumps(data.tail(1), 2))
         self.influx_client.set(data)
 
-    def merge_ticket(self, df):
-        ex = df[df.duplicated(subset = ['time', 'cchange', 'volume', 'amount', 'ctype'], keep=False)]
-        dlist = list(ex.index)
-        while len(dlist) > 0:
-            snum = 1
-            sindex = dlist[0]
-            for _index in range(1, len(dlist)):
-                if sindex + 1 == dlist[_index]: 
-                    snum += 1
-                    if _index == len(dlist) -1:
-                        df.drop_duplicates(keep='first', inplace=True)
-                        df.at[sindex, 'volume'] = snum * df.loc[sindex]['volume']
-                        df.at[sindex, 'amount'] = snum * df.loc[sindex]['amount']
-                else:
-                    df.drop_duplicates(keep='first', inplace=True)
-                    df.at[sindex, 'volume'] = snum * df.loc[sindex]['volume']
-                    df.at[sindex, 'amount'] = snum * df.loc[sindex]['amount']
-                    sindex = dlist[_index]
-                    snum = 1
-            df = df.reset_index(drop = True)
-            ex = df[df.duplicated(subset = ['time', 'cchange', 'volume', 'amount', 'ctype'], keep=False)]
-            dlist = list(ex.index)
+    @staticmethod
+    def merge_ticket(df):
+        #consecutive rows of the same trade are merged into the first one with volume and amount multiplied by the rows,
+        #equal rows which are not next to each other are different trades and kept
+        if len(df) < 2: return df
+        keys = df[['time', 'cchange', 'volume', 'amount', 'ctype']]
+        starts = (keys != keys.shift()).any(axis = 1).values
+        if starts.all(): return df
+        counts = np.diff(np.append(np.flatnonzero(starts), len(df)))
+        df = df[starts].reset_index(drop = True)
+        df['volume'] = df['volume'].values * counts
+        df['amount'] = df['amount'].values * counts
         return df
 
     def get_market(self):
@@ -240,28 +233,19 @@ class CStock(CMysqlObj):
         return "1" if self.get_market() == ct.MARKET_SH else "0"
 
     def read(self, cdate = None, fpath = "/data/tdx/history/days/%s%s.csv"):
+        #the file is parsed once and cached, one day is found by binary search
         prestr = self.get_pre_str()
         filename = fpath % (prestr, self.code)
-        if not os.path.exists(filename): return pd.DataFrame(), None
-        dheaders = ['date', 'open', 'high', 'close', 'low', 'amount', 'volume']
-        df = pd.read_csv(filename, sep = ',', usecols = dheaders)
-        df = df[(df['volume'] > 0) & (df['amount'] > 0)]
-        df = df.drop_duplicates(subset=['date'], keep='first')
-        df = df.sort_values(by = 'date', ascending= True)
-        df = df.reset_index(drop = True)
-        if cdate is not None:
-            index_list = df.loc[df.date == transfer_date_string_to_int(cdate)].index.values
-            if len(index_list) == 0: return pd.DataFrame(), None
-            preday_index = index_list[0] - 1
-            if preday_index < 0:
-                return df.loc[df.date == transfer_date_string_to_int(cdate)], None
-            else:
-                pre_day = df.at[preday_index, 'date']
-                return df.loc[df.date == transfer_date_string_to_int(cdate)], transfer_int_to_date_string(pre_day)
-        return df, None
+        if cdate is None:
+            data = tdx_reader.get(filename, clean = True)
+            return (pd.DataFrame(), None) if data is None else (tdx_reader.to_frame(data), None)
+        df, pre_day = tdx_reader.get_day(filename, transfer_date_string_to_int(cdate))
+        return df, None if pre_day is None else transfer_int_to_date_string(pre_day)
 
     def collect_right_info(self, info, cdate = None):
-        info = info[(info.code == self.code) & (info.date <= int(datetime.now().strftime('%Y%m%d')))]
+        #info is the bonus frame of all stocks or a CRightInfo which gives the rows of the code directly
+        info = info.get_bonus(self.code) if isinstance(info, CRightInfo) else info[info.code == self.code]
+        info = info[info.date <= int(datetime.now().strftime('%Y%m%d'))]
         info = info.sort_values(by = 'date' , ascending = True)
         info = info.reset_index(drop = True)
 
@@ -282,7 +266,8 @@ class CStock(CMysqlObj):
         price_change_info = price_change_info.reset_index(drop = True)
         return quantity_change_info, price_change_info
 
-    def transfer2adjusted(self, df):
+    @staticmethod
+    def transfer2adjusted(df):
         df = df[['date', 'open', 'high', 'close', 'preclose', 'low', 'volume', 'amount', 'outstanding', 'totals', 'adj']]
         df['date'] = df['date'].astype(str)
         df['date'] = pd.to_datetime(df.date).dt.strftime("%Y-%m-%d")
@@ -305,74 +290,31 @@ class CStock(CMysqlObj):
         logger.debug("%s is need reright for %s, now_date:%s, p_date:%s" % (self.code, cdate, now_date, p_date))
         return now_date == p_date
 
-    def relative_index_strength(self, df, index_df, cdate = None):
-        index_df = index_df.loc[index_df.date.isin(df.date.tolist())]
-        if len(df) != len(index_df): logger.debug("length of code %s is not equal to index." % self.code)
-        index_df.index = df.loc[df.date.isin(index_df.date.tolist())].index
-        if cdate is None:
-            df['sai'] = 0
-            df['sri'] = 0
-            s_pchange = (df['close'] - df['preclose']) / df['preclose']
-            i_pchange = (index_df['close'] - index_df['preclose']) / index_df['preclose']
-            df['sri'] = 100 * (s_pchange - i_pchange)
-            df['sri'] = df['sri'].fillna(0)
-            df.at[(i_pchange < 0) & (s_pchange > 0), 'sai'] = df.loc[(i_pchange < 0) & (s_pchange > 0), 'sri']
-        else:
-            s_pchange = (df.loc[df.date == cdate, 'close'] - df.loc[df.date == cdate, 'preclose']) / df.loc[df.date == cdate, 'preclose']
-            s_pchange = s_pchange.values[0]
-            i_pchange = (index_df.loc[index_df.date == cdate, 'close'] - index_df.loc[index_df.date == cdate, 'preclose']) / index_df.loc[index_df.date == cdate, 'preclose']
-            i_pchange = i_pchange.values[0]
-            df['sai'] = 100 * (s_pchange - i_pchange) if s_pchange > 0 and i_pchange < 0 else 0
-            df['sri'] = 100 * (s_pchange - i_pchange)
+    @staticmethod
+    def relative_index_strength(df, index_df, cdate = None):
+        #stock and index are aligned by date, so the days which the stock halted or the index misses do not shift the others,
+        #sri is 0 for a day without index data. with cdate df only has the data of that day and the same kernel is used
+        index_dates, index_pchanges = get_index_changes(index_df)
+        dates = to_int_dates(df.date.values)
+        positions = np.minimum(np.searchsorted(index_dates, dates, 'left'), max(len(index_dates) - 1, 0))
+        i_pchange = np.full(len(dates), np.nan)
+        if len(index_dates) > 0:
+            found = index_dates[positions] == dates
+            i_pchange[found] = index_pchanges[positions[found]]
+        s_pchange = ((df['close'] - df['preclose']) / df['preclose']).values
+        sri = 100 * (s_pchange - i_pchange)
+        sri[np.isnan(sri)] = 0
+        df['sri'] = sri
+        df['sai'] = np.where((i_pchange < 0) & (s_pchange > 0), sri, 0)
         return df 
 
-    def set_oneday_data(self, df, index_df, pre_date, cdate):
-        day_table = self.get_day_table()
-        if self.is_date_exists(day_table, cdate):
-            logger.debug("existed data for code:%s, date:%s" % (self.code, cdate))
-            return True
-       
-        index_df = index_df.loc[index_df.date == cdate]
-
-        preday_df = self.get_k_data(date = pre_date)
-
-        if preday_df is None:
-            logger.error("%s get %s data failed." % (self.code, pre_date))
-            return False
-
-        if preday_df.empty:
-            logger.error("%s get %s data empty." % (self.code, pre_date))
-            return False
-
-        df['adj']         = 1.0
-        df['preclose']    = preday_df['close'][0]
-        df['totals']      = preday_df['totals'][0] 
-        df['outstanding'] = preday_df['outstanding'][0] 
-
-        #transfer data to split-adjusted share prices
-        df = self.transfer2adjusted(df)
-
-        df = self.relative_index_strength(df, index_df, cdate)
-        if df is None: return False
-
-        #set chip distribution
-        dist_df = df.append(preday_df, sort = False)
-        dist_df = dist_df.sort_values(by = 'date', ascending = True)
-        dist_data = self.compute_distribution(dist_df, cdate)
-        if dist_data.empty:
-            logger.error("%s chip distribution compute failed." % self.code)
-            return False
-        if self.set_chip_distribution(dist_data, zdate = cdate):
-            df['uprice'] = mac(dist_data, 0)
-            df['sprice'] = mac(dist_data, 5)
-            df['mprice'] = mac(dist_data, 13)
-            df['lprice'] = mac(dist_data, 37)
-            df = pro_nei_chip(df, dist_data, preday_df, cdate)
-            if is_df_has_unexpected_data(df):
-                logger.error("data for %s is not clean." % self.code)
-                return False
-            if self.mysql_client.set(df, self.get_day_table()):
-                return self.redis.sadd(day_table, cdate)
+    def save_oneday_data(self, df, dist_data, cdate):
+        #io bound part of the update of one day
+        if not self.set_chip_distribution(dist_data, zdate = cdate): return False
+        self.set_chip_checkpoint(dist_data, cdate)
+        if self.mysql_client.set(df, self.get_day_table()):
+            self.set_lake_data(df, append = True)
+            return self.redis.sadd(self.get_day_table(), cdate)
         return False
 
     def set_all_data(self, quantity_change_info, price_change_info, index_info):
@@ -380,52 +322,26 @@ class CStock(CMysqlObj):
         if df.empty:
             logger.error("read empty file for:%s" % self.code)
             return False
+        result = compute_all_data(self.code, df, quantity_change_info, price_change_info, index_info)
+        if result is None: return False
+        return self.save_all_data(*result)
 
-        #modify price and quanity for all split-adjusted share prices
-        df = self.adjust_share(df, quantity_change_info)
-        if df.empty: 
-            logger.error("adjust share %s failed" % self.code)
-            return False
-        
-        df = self.qfq(df, price_change_info)
-        if df.empty: 
-            logger.error("qfq %s failed" % self.code)
-            return False
-
-        #transfer data to split-adjusted share prices
-        df = self.transfer2adjusted(df)
-
-        #compute strength relative index
-        df = self.relative_index_strength(df, index_info)
-        if df is None:
-            logger.error("length of code %s is not equal to index." % self.code)
-            return False
-
-        #set chip distribution
-        dist_data = self.compute_distribution(df)
-        if dist_data.empty:
-            logger.error("%s is empty distribution." % self.code)
-            return False
-
+    def save_all_data(self, df, dist_data):
+        #io bound part of set_all_data
         if not self.set_chip_distribution(dist_data):
             logger.error("store %s distribution failed" % self.code)
             return False
 
-        df['uprice'] = mac(dist_data, 0)
-        df['sprice'] = mac(dist_data, 5)
-        df['mprice'] = mac(dist_data, 13)
-        df['lprice'] = mac(dist_data, 37)
-        df = pro_nei_chip(df, dist_data)
-
-        if is_df_has_unexpected_data(df):
-            logger.error("data for %s is not clean." % self.code)
-            return False
+        last_date = df.date.values[-1]
+        self.set_chip_checkpoint(dist_data.loc[dist_data.date == last_date], last_date)
 
         day_table = self.get_day_table()
-        if not self.mysql_client.delsert(df, day_table): 
+        if not self.mysql_client.delsert(df, day_table, bulk = True): 
             logger.error("save %s data to mysql failed." % self.code)
             return False
 
+        self.set_lake_data(df)
+
         self.redis.sadd(day_table, *set(df.date.tolist()))
         return True
 
@@ -447,30 +363,77 @@ class CStock(CMysqlObj):
         df['profit'] = 0.0
         df = base_floating_profit(df)
         #return self.mysql_client.delsert(df, self.get_day_table())
-        return self.mysql_client.upsert(df, self.get_day_table(), pri_keys = ['date'])
+        if not self.mysql_client.upsert(df, self.get_day_table(), pri_keys = ['date']): return False
+        self.set_lake_data(df)
+        return True
 
-    def set_k_data(self, bonus_info, index_info, cdate = None):
+    def set_lake_data(self, df, append = False):
+        #mysql is the source of truth, the lake table is rebuilt from it when it can not be appended
+        if self.lake is None: return True
+        table_name = self.get_day_table()
+        if append and self.lake.append(df, table_name): return True
+        if append:
+            df = self.mysql_client.get("select * from %s" % table_name)
+            if df is None: return self.lake.delete(table_name)
+        return self.lake.set(df, table_name)
+
+    def read_k_data(self, bonus_info, cdate = None):
+        #read stage of set_k_data, it only does io. returns (succeed, data), data is (zdate, inputs) for compute_k_data
+        #and zdate is None when all data should be recomputed, the code is finished when data is None
         if not self.has_on_market(cdate):
             logger.debug("%s not on market %s" % (self.code, cdate))
-            return True
+            return True, None
         quantity_change_info, price_change_info = self.collect_right_info(bonus_info)
-        if cdate is None or self.is_need_reright(cdate, price_change_info):
-            return self.set_all_data(quantity_change_info, price_change_info, index_info)
-        else:
+        if cdate is not None and not self.is_need_reright(cdate, price_change_info):
             today_df, pre_date = self.read(cdate)
-            if today_df.empty: return True
-            if pre_date is None:
-                return self.set_all_data(quantity_change_info, price_change_info, index_info)
-            else:
-                return self.set_oneday_data(today_df, index_info, pre_date, cdate)
+            if today_df.empty: return True, None
+            if pre_date is not None: return self.read_oneday_data(today_df, pre_date, cdate)
+        df, _ = self.read()
+        if df.empty:
+            logger.error("read empty file for:%s" % self.code)
+            return False, None
+        return True, (None, (df, quantity_change_info, price_change_info))
+
+    def read_oneday_data(self, df, pre_date, cdate):
+        if self.is_date_exists(self.get_day_table(), cdate):
+            logger.debug("existed data for code:%s, date:%s" % (self.code, cdate))
+            return True, None
+
+        preday_df = self.get_k_data(date = pre_date)
+        if preday_df is None:
+            logger.error("%s get %s data failed." % (self.code, pre_date))
+            return False, None
+
+        if preday_df.empty:
+            logger.error("%s get %s data empty." % (self.code, pre_date))
+            return False, None
+
+        pre_date_dist = self.get_chip_checkpoint(pre_date)
+        if pre_date_dist.empty:
+            logger.error("pre data for %s dist %s is empty" % (self.code, pre_date))
+            return False, None
+        return True, (cdate, (df, preday_df, pre_date_dist))
+
+    def save_k_data(self, result):
+        #write stage of set_k_data
+        zdate, df, dist_data = result
+        if zdate is None: return self.save_all_data(df, dist_data)
+        return self.save_oneday_data(df, dist_data, zdate)
+
+    def set_k_data(self, bonus_info, index_info, cdate = None):
+        succeed, data = self.read_k_data(bonus_info, cdate)
+        if not succeed or data is None: return succeed
+        result = compute_k_data(self.code, data, index_info)
+        if result is None: return False
+        return self.save_k_data(result)
 
     def get_chip_distribution(self, mdate = None):
         df = pd.DataFrame()
         if mdate is not None:
             table = self.get_chip_distribution_table(mdate)
             if self.is_table_exists(table):
-                df = self.mysql_client.get("select * from %s" % table)
-                return df.loc[df.date == mdate]
+                df = self.mysql_client.get("select * from %s where date=\"%s\"" % (table, mdate))
+                return pd.DataFrame() if df is None else df
         else:
             time2Market = self.get('timeToMarket')
             start_year  = int(time2Market / 10000)
@@ -484,30 +447,51 @@ class CStock(CMysqlObj):
         return df
 
     def compute_distribution(self, data, zdate = None):
-        data = data[['date', 'open', 'aprice', 'outstanding', 'volume', 'amount']]
-        if zdate is None:
-            df = compute_distribution(data)
-        else:
-            mdate_list = data.date.tolist()
-            pre_date, now_date = mdate_list
-            if now_date != zdate:
-                logger.error("%s data new date %s is not equal to now date %s" % (self.code, now_date, zdate))
-                return pd.DataFrame()
-
-            pre_date_dist = self.get_chip_distribution(pre_date)
+        pre_date_dist = None
+        if zdate is not None:
+            pre_date = data.date.tolist()[0]
+            pre_date_dist = self.get_chip_checkpoint(pre_date)
             if pre_date_dist.empty:
                 logger.error("pre data for %s dist %s is empty" % (self.code, pre_date))
                 return pd.DataFrame()
-            pre_date_dist = pre_date_dist.sort_values(by = 'pos', ascending= True)
-            pos = data.loc[data.date == zdate].index[0]
-            volume = data.loc[data.date == zdate, 'volume'].tolist()[0]
-            aprice = data.loc[data.date == zdate, 'aprice'].tolist()[0]
-            outstanding = data.loc[data.date == zdate, 'outstanding'].tolist()[0]
-            pre_outstanding = data.loc[data.date == pre_date, 'outstanding'].tolist()[0]
-            zdate = zdate.encode("UTF-8")
-            df = compute_oneday_distribution(pre_date_dist, zdate, pos, volume, aprice, pre_outstanding, outstanding)
+        return compute_chip_distribution(self.code, data, zdate, pre_date_dist)
+
+    def get_chip_checkpoint_file(self):
+        return os.path.join(ct.CHIP_CHECKPOINT_DIR, "%s.npz" % self.dbname)
+
+    def get_chip_checkpoint(self, mdate):
+        #the latest chip distribution is kept in a local columnar file, rebuild it from mysql if it is missing or stale
+        filename = self.get_chip_checkpoint_file()
+        if os.path.exists(filename):
+            try:
+                with np.load(filename) as data:
+                    if str(data['mdate']) == mdate:
+                        return pd.DataFrame({column: data[column] for column in ct.CHIP_COLUMNS}, columns = ct.CHIP_COLUMNS)
+            except Exception as e:
+                logger.error("load chip checkpoint %s failed:%s" % (filename, e))
+        logger.debug("rebuild chip checkpoint for code:%s, date:%s" % (self.code, mdate))
+        df = self.get_chip_distribution(mdate)
+        if not df.empty: self.set_chip_checkpoint(df, mdate)
         return df
 
+    def set_chip_checkpoint(self, df, mdate):
+        filename = self.get_chip_checkpoint_file()
+        tmp_filename = "%s.tmp.npz" % filename[:-len(".npz")]
+        try:
+            if not os.path.exists(ct.CHIP_CHECKPOINT_DIR): os.makedirs(ct.CHIP_CHECKPOINT_DIR, exist_ok = True)
+            np.savez(tmp_filename, mdate = mdate,
+                                   pos = df['pos'].values.astype(np.int64),
+                                   sdate = df['sdate'].values.astype(str),
+                                   date = df['date'].values.astype(str),
+                                   price = df['price'].values.astype(float),
+                                   volume = df['volume'].values.astype(np.int64),
+                                   outstanding = df['outstanding'].values.astype(np.int64))
+            os.replace(tmp_filename, filename)
+            return True
+        except Exception as e:
+            logger.error("save chip checkpoint %s failed:%s" % (filename, e))
+            return False
+
     def set_chip_table(self, df, myear):
         #get new df
         tmp_df = df.loc[df.date.str.startswith(myear)]
@@ -520,11 +504,11 @@ class CStock(CMysqlObj):
             if not self.create_chip_table(chip_table):
                 logger.error("create chip table:%s failed" % chip_table)
                 return (myear, False)
-            if not self.mysql_client.set(tmp_df, chip_table):
+            if not self.mysql_client.bulk_set(tmp_df, chip_table):
                 return (myear, False)
         else:
             #update df to mysql
-            if not self.mysql_client.delsert(tmp_df, chip_table):
+            if not self.mysql_client.delsert(tmp_df, chip_table, bulk = True):
                 return (myear, False)
         self.redis.sadd(chip_table, *set(tmp_df.date.tolist()))
         return (myear, True)
@@ -618,18 +602,114 @@ class CStock(CMysqlObj):
         sql = "select * from %s where date=\"%s\"" %(self.get_redis_tick_table(cdate), cdate)
         return self.mysql_client.get(sql)
    
-    def get_k_data_in_range(self, start_date, end_date, dtype = 9):
+    def get_k_data_in_range(self, start_date, end_date, dtype = 9, columns = None, where = list()):
         table_name = self.get_day_table()
-        sql = "select * from %s where date between \"%s\" and \"%s\"" %(table_name, start_date, end_date)
-        return self.mysql_client.get(sql)
+        if self.lake is not None and self.lake.is_table_exists(table_name):
+            df = self.lake.get(table_name, start_date, end_date, columns, where)
+            if df is not None: return df
+        return self.mysql_client.select(table_name, columns, [('date', '>=', start_date), ('date', '<=', end_date)] + list(where))
 
-    def get_k_data(self, date = None, dtype = 9):
+    def get_k_data(self, date = None, dtype = 9, columns = None, where = list()):
+        #columns and where are pushed down to the data lake or mysql, where is a list of (column, operator, value)
         table_name = self.get_day_table()
-        if date is not None:
-            sql = "select * from %s where date=\"%s\"" %(table_name, date)
-        else:
-            sql = "select * from %s" % table_name
-        return self.mysql_client.get(sql)
+        if self.lake is not None and self.lake.is_table_exists(table_name):
+            df = self.lake.get(table_name, date, date, columns, where)
+            if df is not None and (date is None or not df.empty): return df
+        date_where = list() if date is None else [('date', '=', date)]
+        return self.mysql_client.select(table_name, columns, date_where + list(where))
+
+def compute_chip_distribution(code, data, zdate = None, pre_date_dist = None):
+    #with zdate data has the rows of the day before and zdate, pre_date_dist is the distribution of the day before
+    data = data[['date', 'open', 'aprice', 'outstanding', 'volume', 'amount']]
+    if zdate is None: return compute_distribution(data)
+    pre_date, now_date = data.date.tolist()
+    if now_date != zdate:
+        logger.error("%s data new date %s is not equal to now date %s" % (code, now_date, zdate))
+        return pd.DataFrame()
+    pre_date_dist = pre_date_dist.sort_values(by = 'pos', ascending= True)
+    pos = data.loc[data.date == zdate].index[0]
+    volume = data.loc[data.date == zdate, 'volume'].tolist()[0]
+    aprice = data.loc[data.date == zdate, 'aprice'].tolist()[0]
+    outstanding = data.loc[data.date == zdate, 'outstanding'].tolist()[0]
+    pre_outstanding = data.loc[data.date == pre_date, 'outstanding'].tolist()[0]
+    zdate = zdate.encode("UTF-8")
+    return compute_oneday_distribution(pre_date_dist, zdate, pos, volume, aprice, pre_outstanding, outstanding)
+
+def compute_all_data(code, df, quantity_change_info, price_change_info, index_info):
+    #cpu bound part of set_all_data, it does not touch mysql or redis, returns (df, dist_data) or None
+    #modify price and quanity for all split-adjusted share prices
+    df = CStock.adjust_share(df, quantity_change_info)
+    if df.empty: 
+        logger.error("adjust share %s failed" % code)
+        return None
+    
+    df = CStock.qfq(df, price_change_info)
+    if df.empty: 
+        logger.error("qfq %s failed" % code)
+        return None
+
+    #transfer data to split-adjusted share prices
+    df = CStock.transfer2adjusted(df)
+
+    #compute strength relative index
+    df = CStock.relative_index_strength(df, index_info)
+    if df is None:
+        logger.error("length of code %s is not equal to index." % code)
+        return None
+
+    #compute chip distribution
+    dist_data = compute_chip_distribution(code, df)
+    if dist_data.empty:
+        logger.error("%s is empty distribution." % code)
+        return None
+
+    df['uprice'], df['sprice'], df['mprice'], df['lprice'] = mac_multi(dist_data, [0, 5, 13, 37])
+    df = pro_nei_chip(df, dist_data)
+
+    if is_df_has_unexpected_data(df):
+        logger.error("data for %s is not clean." % code)
+        return None
+    return df, dist_data
+
+def compute_oneday_data(code, df, preday_df, pre_date_dist, index_df, cdate):
+    #cpu bound part of the update of one day, returns (df, dist_data) or None
+    index_df = index_df.loc[index_df.date == cdate]
+    df['adj']         = 1.0
+    df['preclose']    = preday_df['close'][0]
+    df['totals']      = preday_df['totals'][0] 
+    df['outstanding'] = preday_df['outstanding'][0] 
+
+    #transfer data to split-adjusted share prices
+    df = CStock.transfer2adjusted(df)
+
+    df = CStock.relative_index_strength(df, index_df, cdate)
+    if df is None: return None
+
+    #set chip distribution
+    dist_df = df.append(preday_df, sort = False)
+    dist_df = dist_df.sort_values(by = 'date', ascending = True)
+    dist_data = compute_chip_distribution(code, dist_df, cdate, pre_date_dist)
+    if dist_data.empty:
+        logger.error("%s chip distribution compute failed." % code)
+        return None
+    df['uprice'], df['sprice'], df['mprice'], df['lprice'] = mac_multi(dist_data, [0, 5, 13, 37])
+    df = pro_nei_chip(df, dist_data, preday_df, cdate)
+    if is_df_has_unexpected_data(df):
+        logger.error("data for %s is not clean." % code)
+        return None
+    return df, dist_data
+
+def compute_k_data(code, data, index_info):
+    #compute stage of set_k_data, it runs in a worker process and only takes plain data and the memory mapped right info,
+    #returns (zdate, df, dist_data) or None
+    zdate, inputs = data
+    if zdate is None:
+        df, quantity_change_info, price_change_info = inputs
+        result = compute_all_data(code, df, quantity_change_info, price_change_info, get_index_info(index_info, df.date.values))
+    else:
+        result = compute_oneday_data(code, *inputs, get_index_info(index_info, [zdate]), zdate)
+    if result is None: return None
+    return (zdate,) + tuple(result)
 
 if __name__ == '__main__':
     cdate = None
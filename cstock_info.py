@@ -9,6 +9,7 @@ import const as ct
 import tushare as ts
 from cstock import CStock 
 from base.clog import getLogger
+from base.ccache import frame_cache
 from common import create_redis_obj, concurrent_run, smart_get
 logger = getLogger(__name__)
 class CStockInfo:
@@ -66,7 +67,7 @@ class CStockInfo:
         df = smart_get(ts.get_stock_basics)
         if df is None: return False
         df = df.reset_index(drop = False)
-        return self.redis.set(ct.STOCK_INFO, _pickle.dumps(df, 2))
+        return frame_cache.set(self.redis, ct.STOCK_INFO, df)
 
     def update(self):
         if self.init():
@@ -77,14 +78,11 @@ class CStockInfo:
     @staticmethod
     def get(code = None, column = None, redis = None, redis_host = None):
         if redis is None: redis = create_redis_obj() if redis_host is None else create_redis_obj(host = redis_host)
-        df_byte = redis.get(ct.STOCK_INFO)
-        if df_byte is None: return pd.DataFrame()
-        df = _pickle.loads(df_byte)
-        if code is None: return df
+        if code is None: return frame_cache.get(redis, ct.STOCK_INFO)
         if column is None:
-            return df.loc[df.code == code]
+            return frame_cache.get_rows(redis, ct.STOCK_INFO, 'code', code)
         else:
-            return df.loc[df.code == code][column].values[0]
+            return frame_cache.get_value(redis, ct.STOCK_INFO, 'code', code, column)
 
     def get_classified_stocks(self, code_list = list()):
         df = self.get()
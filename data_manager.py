@@ -7,10 +7,11 @@ import datetime
 import traceback
 import const as ct
 import pandas as pd
-from cstock import CStock
+from cstock import CStock, compute_k_data
 from cindex import CIndex, TdxFgIndex
 from climit import CLimit 
 from base.clog import getLogger 
+from base.cpipeline import CStagePipeline
 from functools import partial
 from datetime import datetime
 from rstock import RIndexStock
@@ -19,6 +20,7 @@ from animation import CAnimation
 from index_info import IndexInfo
 from ticks import download, unzip
 from cstock_info import CStockInfo
+from right_info import CRightInfo
 from combination import Combination
 from industry_info import IndustryInfo
 from datamanager.margin  import Margin
@@ -361,17 +363,20 @@ class DataManager:
         return process_concurrent_run(_set_base_float_profit, failed_list, num = 50)
 
     def init_stock_info(self, cdate = None):
-        def _set_stock_info(_date, bonus_info, index_info, code_id):
-            try:
-                if CStock(code_id).set_k_data(bonus_info, index_info, _date):
-                    self.logger.info("%s set k data success for date:%s", code_id, _date)
-                    return (code_id, True)
-                else:
-                    self.logger.error("%s set k data failed for date:%s", code_id, _date)
-                    return (code_id, False)
-            except Exception as e:
-                self.logger.error("%s set k data for date %s exception:%s", code_id, _date, e)
-                return (code_id, False)
+        #staged pipeline: read tdx files, the day before and the chip checkpoint in greenlets,
+        #compute adjust share, qfq, chip distribution and profit from plain data in processes, bulk write to mysql in greenlets
+        def _read_stock_info(code_id):
+            return CStock(code_id).read_k_data(bonus_info, cdate)
+
+        def _compute_stock_info(code_id, data):
+            return compute_k_data(code_id, data, index_info)
+
+        def _write_stock_info(code_id, result):
+            if CStock(code_id).save_k_data(result):
+                self.logger.info("%s set k data success for date:%s", code_id, cdate)
+                return True
+            self.logger.error("%s set k data failed for date:%s", code_id, cdate)
+            return False
 
         #get stock bonus info
         bonus_info = pd.read_csv("/data/tdx/base/bonus.csv", sep = ',',
@@ -379,26 +384,20 @@ class DataManager:
 
         index_info = CIndex('000001').get_k_data()
         if index_info is None or index_info.empty: return False
+
+        #bonus info grouped by code and the index are memory mapped, workers look up the rows of their code and dates
+        #without filtering the whole frames, and the forked workers share the pages
+        right_info = CRightInfo()
+        if not right_info.build(bonus_info, index_info): return False
+        bonus_info = index_info = right_info
+
         df = self.stock_info_client.get()
-        failed_list = df.code.tolist()
-        if cdate is None:
-            cfunc = partial(_set_stock_info, cdate, bonus_info, index_info)
-            return process_concurrent_run(cfunc, failed_list, num = 5)
-        else:
-            cfunc = partial(_set_stock_info, cdate, bonus_info, index_info)
-            succeed = True
-            if not process_concurrent_run(cfunc, failed_list, num = 5):
-                succeed = False
-            return succeed
-            #start_date = get_day_nday_ago(cdate, num = 4, dformat = "%Y-%m-%d")
-            #for mdate in get_dates_array(start_date, cdate, asending = True):
-            #    if self.cal_client.is_trading_day(mdate):
-            #        self.logger.info("start recording stock info: %s", mdate)
-            #        cfunc = partial(_set_stock_info, mdate, bonus_info, index_info)
-            #        if not process_concurrent_run(cfunc, failed_list, num = 500):
-            #            self.logger.error("compute stock info for %s failed", mdate)
-            #            return False
-            #return True
+        pipeline = CStagePipeline(_read_stock_info, _compute_stock_info, _write_stock_info, read_num = 5, write_num = 5)
+        failed_list = pipeline.run(df.code.tolist())
+        if len(failed_list) > 0:
+            self.logger.error("set k data failed for date:%s, codes:%s", cdate, failed_list)
+            return False
+        return True
 
     def init_industry_info(self, cdate, num):
         def _set_industry_info(cdate, code_id):
@@ -410,11 +409,10 @@ class DataManager:
         else:
             succeed = True
             start_date = get_day_nday_ago(cdate, num = num, dformat = "%Y-%m-%d")
-            for mdate in get_dates_array(start_date, cdate, asending = True):
-                if self.cal_client.is_trading_day(mdate):
-                    cfunc = partial(_set_industry_info, mdate)
-                    if not concurrent_run(cfunc, df.code.tolist(), num = 5):
-                        succeed = False
+            for mdate in self.cal_client.get_trading_days(start_date, cdate, redis = self.cal_client.redis):
+                cfunc = partial(_set_industry_info, mdate)
+                if not concurrent_run(cfunc, df.code.tolist(), num = 5):
+                    succeed = False
             return succeed
 
     def init_yesterday_hk_info(self, cdate, num):
@@ -473,11 +471,10 @@ class DataManager:
         else:
             succeed = True
             start_date = get_day_nday_ago(cdate, num = num, dformat = "%Y-%m-%d")
-            for mdate in get_dates_array(start_date, cdate, asending = True):
-                if self.cal_client.is_trading_day(mdate):
-                    cfunc = partial(_set_index_info, mdate)
-                    if not concurrent_run(cfunc, index_code_list, num = 5):
-                        succeed = False
+            for mdate in self.cal_client.get_trading_days(start_date, cdate, redis = self.cal_client.redis):
+                cfunc = partial(_set_index_info, mdate)
+                if not concurrent_run(cfunc, index_code_list, num = 5):
+                    succeed = False
             return succeed
 
     def download_and_extract(self, cdate, num = 10):
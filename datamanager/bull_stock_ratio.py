@@ -10,7 +10,7 @@ from datetime import datetime
 from rstock import RIndexStock
 from cindex import CIndex
 from ccalendar import CCalendar
-from common import create_redis_obj, get_day_nday_ago, get_dates_array
+from common import create_redis_obj, get_day_nday_ago, get_dates_array, is_redis_member
 class BullStockRatio:
     def __init__(self, index_code, dbinfo = ct.DB_INFO, redis_host = None):
         self.dbinfo = dbinfo
@@ -37,9 +37,7 @@ class BullStockRatio:
         return True
 
     def is_date_exists(self, table_name, cdate):
-        if self.redis.exists(table_name):
-            return cdate in set(str(tdate, encoding = ct.UTF8) for tdate in self.redis.smembers(table_name))
-        return False
+        return is_redis_member(self.redis, table_name, cdate)
 
     def get_k_data_between(self, start_date, end_date):
         sql = "select * from %s where date between \"%s\" and \"%s\"" % (self.get_table_name(), start_date, end_date)
@@ -64,11 +62,10 @@ class BullStockRatio:
         if 0 == len(code_list):
             self.logger.error("%s code_list for %s is empty" % (end_date, self.index_code))
             return False
-        for mdate in get_dates_array(start_date, end_date):
-            if CCalendar.is_trading_day(mdate, redis = self.redis):
-                if not self.set_ratio(code_list, mdate):
-                    self.logger.error("set %s score for %s set failed" % (self.index_code, mdate))
-                    succeed = False
+        for mdate in CCalendar.get_trading_days(start_date, end_date, asending = False, redis = self.redis):
+            if not self.set_ratio(code_list, mdate):
+                self.logger.error("set %s score for %s set failed" % (self.index_code, mdate))
+                succeed = False
         return succeed
 
     def get_profit_stocks(self, df):
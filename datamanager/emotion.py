@@ -45,11 +45,10 @@ class Emotion:
         if end_date is None: end_date = datetime.now().strftime('%Y-%m-%d')
         start_date = get_day_nday_ago(end_date, num = num, dformat = "%Y-%m-%d")
         succeed = True
-        for mdate in get_dates_array(start_date, end_date):
-            if CCalendar.is_trading_day(mdate, redis = self.redis):
-                if not self.set_score(mdate):
-                    succeed = False
-                    self.logger.info("set score for %s set failed" % mdate)
+        for mdate in CCalendar.get_trading_days(start_date, end_date, asending = False, redis = self.redis):
+            if not self.set_score(mdate):
+                succeed = False
+                self.logger.info("set score for %s set failed" % mdate)
         return succeed
 
     def set_score(self, cdate = datetime.now().strftime('%Y-%m-%d')):
@@ -10,7 +10,7 @@ from cmysql import CMySQL
 from datetime import datetime
 from ccalendar import CCalendar
 from collections import OrderedDict
-from common import get_day_nday_ago, create_redis_obj, get_dates_array, get_tushare_client, transfer_date_string_to_int, smart_get, delta_days
+from common import get_day_nday_ago, create_redis_obj, get_dates_array, get_tushare_client, transfer_date_string_to_int, smart_get, delta_days, is_redis_member, get_quarter_ranges
 from base.clog import getLogger
 class Margin(object):
     def __init__(self, dbinfo = ct.DB_INFO, redis_host = None):
@@ -30,9 +30,7 @@ class Margin(object):
         return "%s_day_%s_%s" % (self.dbname, cdates[0], (int(cdates[1])-1)//3 + 1)
 
     def is_date_exists(self, table_name, cdate):
-        if self.redis.exists(table_name):
-            return cdate in set(tdate.decode() for tdate in self.redis.smembers(table_name))
-        return False
+        return is_redis_member(self.redis, table_name, cdate)
 
     def create_table(self, table):
         sql = 'create table if not exists %s(date varchar(10) not null,\
@@ -48,29 +46,10 @@ class Margin(object):
                                              PRIMARY KEY (date, code))' % table
         return True if table in self.mysql_client.get_all_tables() else self.mysql_client.create(sql, table)
 
-    def get_k_data_in_range(self, start_date, end_date):
-        ndays = delta_days(start_date, end_date)
-        date_dmy_format = time.strftime("%m/%d/%Y", time.strptime(start_date, "%Y-%m-%d"))
-        data_times = pd.date_range(date_dmy_format, periods=ndays, freq='D')
-        date_only_array = np.vectorize(lambda s: s.strftime('%Y-%m-%d'))(data_times.to_pydatetime())
-        data_dict = OrderedDict()
-        for _date in date_only_array:
-            if CCalendar.is_trading_day(_date, redis = self.redis):
-                table_name = self.get_table_name(_date)
-                if table_name not in data_dict: data_dict[table_name] = list()
-                data_dict[table_name].append(str(_date))
-        all_df = pd.DataFrame()
-        for key in data_dict:
-            table_list = sorted(data_dict[key], reverse=False)
-            if len(table_list) == 1:
-                df = self.get_data(table_list[0])
-                if df is not None: all_df = all_df.append(df)
-            else:
-                start_date = table_list[0]
-                end_date = table_list[len(table_list) - 1]
-                df = self.get_data_between(start_date, end_date)
-                if df is not None: all_df = all_df.append(df)
-        return all_df
+    def get_k_data_in_range(self, start_date, end_date, columns = None):
+        table_ranges = [item for item in get_quarter_ranges(start_date, end_date, self.get_table_name) if self.is_table_exists(item[0])]
+        df = self.mysql_client.get_in_ranges(table_ranges, columns)
+        return pd.DataFrame() if df is None else df
 
     def get_data_between(self, start_date, end_date):
         #start_date and end_date should be in the same table
@@ -86,20 +65,16 @@ class Margin(object):
     def update(self, end_date = None, num = 10):
         if end_date is None: end_date = datetime.now().strftime('%Y-%m-%d')
         start_date = get_day_nday_ago(end_date, num = num, dformat = "%Y-%m-%d")
-        date_array = get_dates_array(start_date, end_date)
         succeed = True
-        for mdate in date_array:
-            if CCalendar.is_trading_day(mdate, redis = self.redis):
-                if mdate == end_date: continue
-                if not self.set_data(mdate):
-                    self.logger.error("%s set failed" % mdate)
-                    succeed = False
+        for mdate in CCalendar.get_trading_days(start_date, end_date, asending = False, redis = self.redis):
+            if mdate == end_date: continue
+            if not self.set_data(mdate):
+                self.logger.error("%s set failed" % mdate)
+                succeed = False
         return succeed
 
     def is_table_exists(self, table_name):
-        if self.redis.exists(self.dbname):
-            return table_name in set(table.decode() for table in self.redis.smembers(self.dbname))
-        return False
+        return is_redis_member(self.redis, self.dbname, table_name)
 
     def set_data(self, cdate = datetime.now().strftime('%Y-%m-%d')):
         table_name = self.get_table_name(cdate)
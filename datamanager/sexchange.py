@@ -10,7 +10,7 @@ from cmysql import CMySQL
 from datetime import datetime
 from base.clog import getLogger
 from ccalendar import CCalendar
-from common import create_redis_obj, get_day_nday_ago, get_dates_array, smart_get, int_random, loads_jsonp, float_random
+from common import create_redis_obj, get_day_nday_ago, get_dates_array, smart_get, int_random, loads_jsonp, float_random, is_redis_member
 class StockExchange(object):
     def __init__(self, market = ct.SH_MARKET_SYMBOL, dbinfo = ct.DB_INFO, redis_host = None):
         self.market       = market
@@ -61,14 +61,10 @@ class StockExchange(object):
         return self.mysql_client.get(sql)
 
     def is_table_exists(self, table_name):
-        if self.redis.exists(self.dbname):
-            return table_name in set(str(table, encoding = "utf8") for table in self.redis.smembers(self.dbname))
-        return False
+        return is_redis_member(self.redis, self.dbname, table_name)
 
     def is_date_exists(self, table_name, cdate):
-        if self.redis.exists(table_name):
-            return cdate in set(str(tdate, encoding = "utf8") for tdate in self.redis.smembers(table_name))
-        return False
+        return is_redis_member(self.redis, table_name, cdate)
 
     def get_url(self):
         if self.market == ct.SH_MARKET_SYMBOL:
@@ -214,12 +210,11 @@ class StockExchange(object):
         if end_date == datetime.now().strftime('%Y-%m-%d'): end_date = get_day_nday_ago(end_date, num = 1, dformat = "%Y-%m-%d")
         start_date = get_day_nday_ago(end_date, num = num, dformat = "%Y-%m-%d")
         succeed = True
-        for mdate in get_dates_array(start_date, end_date):
+        for mdate in CCalendar.get_trading_days(start_date, end_date, asending = False, redis = self.redis):
             if mdate in self.balcklist: continue
-            if CCalendar.is_trading_day(mdate, redis = self.redis):
-                if not self.set_k_data(mdate):
-                    succeed = False
-                    self.logger.info("market %s for %s set failed" % (self.market, mdate))
+            if not self.set_k_data(mdate):
+                succeed = False
+                self.logger.info("market %s for %s set failed" % (self.market, mdate))
         return succeed
 
 if __name__ == '__main__':
@@ -7,6 +7,7 @@ import pandas as pd
 from cindex import CIndex
 from pandas import DataFrame
 from base.clog import getLogger
+from base.ccache import frame_cache
 from common import create_redis_obj, concurrent_run
 logger = getLogger(__name__)
 class IndustryInfo:
@@ -22,7 +23,7 @@ class IndustryInfo:
         new_self_defined_df['best'] = '0'
         new_df = new_df.append(new_self_defined_df)
         new_df = new_df.reset_index(drop = True)
-        self.redis.set(ct.INDUSTRY_INFO, _pickle.dumps(new_df, 2))
+        frame_cache.set(self.redis, ct.INDUSTRY_INFO, new_df)
         return True
 
     def create_obj(self, code):
@@ -41,8 +42,7 @@ class IndustryInfo:
     @staticmethod
     def get(redis = None):
         redis = create_redis_obj() if redis is None else redis
-        df_byte = redis.get(ct.INDUSTRY_INFO) 
-        return pd.DataFrame() if df_byte is None else _pickle.loads(df_byte)
+        return frame_cache.get(redis, ct.INDUSTRY_INFO)
 
     def get_industry_name_dict_from_tongdaxin(self, fname):
         industry_dict = dict()
@@ -0,0 +1,74 @@
+#coding=utf-8
+import os
+import json
+import shutil
+import const as ct
+import numpy as np
+import pandas as pd
+from base.clog import getLogger
+logger = getLogger(__name__)
+class CRightInfo:
+    #bonus events of all stocks grouped by code and the close/preclose of the index,
+    #every column is a .npy file read by memory map, so forked workers share the pages,
+    #the rows of a code are contiguous and are found in O(1) by the code to (start, end) dict
+    META_FILE = 'meta.json'
+    BONUS_COLUMNS = ['date', 'type', 'money', 'price', 'count', 'rate']
+    INDEX_COLUMNS = ['date', 'close', 'preclose']
+    def __init__(self, root = ct.RIGHT_INFO_DIR):
+        self.root = root
+        self.bonus = None
+        self.ranges = dict()
+        self.index = None
+
+    def get_file(self, dirname, name):
+        return os.path.join(dirname, "%s.npy" % name)
+
+    def build(self, bonus_info, index_info):
+        #files are written to a temporary directory first and then the old directory is replaced
+        tmp_dir = "%s.tmp" % self.root
+        bonus_info = bonus_info.sort_values(by = ['code', 'date'], ascending = True, kind = 'mergesort')
+        index_info = index_info.sort_values(by = 'date', ascending = True, kind = 'mergesort')
+        codes, starts, counts = np.unique(bonus_info['code'].values.astype(str), return_index = True, return_counts = True)
+        try:
+            shutil.rmtree(tmp_dir, ignore_errors = True)
+            os.makedirs(tmp_dir)
+            for column in self.BONUS_COLUMNS:
+                np.save(self.get_file(tmp_dir, "bonus_%s" % column), bonus_info[column].values)
+            for column in self.INDEX_COLUMNS:
+                values = index_info[column].values.astype(str) if column == 'date' else index_info[column].values.astype(np.float64)
+                np.save(self.get_file(tmp_dir, "index_%s" % column), values)
+            ranges = {code: (int(start), int(start + count)) for code, start, count in zip(codes.tolist(), starts.tolist(), counts.tolist())}
+            with open(os.path.join(tmp_dir, self.META_FILE), 'w') as f:
+                json.dump({'ranges': ranges}, f)
+            shutil.rmtree(self.root, ignore_errors = True)
+            os.rename(tmp_dir, self.root)
+        except Exception as e:
+            logger.error("build right info in %s failed:%s" % (self.root, e))
+            shutil.rmtree(tmp_dir, ignore_errors = True)
+            return False
+        return self.load()
+
+    def load(self):
+        try:
+            with open(os.path.join(self.root, self.META_FILE)) as f:
+                self.ranges = {code: tuple(pos) for code, pos in json.load(f)['ranges'].items()}
+            self.bonus = {column: np.load(self.get_file(self.root, "bonus_%s" % column), mmap_mode = 'r') for column in self.BONUS_COLUMNS}
+            self.index = {column: np.load(self.get_file(self.root, "index_%s" % column), mmap_mode = 'r') for column in self.INDEX_COLUMNS}
+            return True
+        except Exception as e:
+            logger.error("load right info from %s failed:%s" % (self.root, e))
+            return False
+
+    def get_bonus(self, code):
+        #only the rows of code are copied out of the memory map
+        start, end = self.ranges.get(code, (0, 0))
+        df = pd.DataFrame({column: np.array(self.bonus[column][start:end]) for column in self.BONUS_COLUMNS}, columns = self.BONUS_COLUMNS)
+        df['code'] = code
+        return df
+
+    def get_index(self, start_date = None, end_date = None):
+        #both dates are included, the dates are sorted, so only the rows in the range are copied out of the memory map
+        dates = self.index['date']
+        start = 0 if start_date is None else int(np.searchsorted(dates, start_date, 'left'))
+        end = len(dates) if end_date is None else int(np.searchsorted(dates, end_date, 'right'))
+        return pd.DataFrame({column: np.array(self.index[column][start:end]) for column in self.INDEX_COLUMNS}, columns = self.INDEX_COLUMNS)
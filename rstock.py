@@ -1,4 +1,5 @@
 #coding=utf-8
+import sys
 import time
 import datetime
 import const as ct
@@ -9,10 +10,11 @@ from datetime import datetime
 from base.clog import getLogger
 from cmysql import CMySQL
 from cstock import CStock
+from cdatalake import CDataLake
 from ccalendar import CCalendar
 from cstock_info import CStockInfo
 from collections import OrderedDict
-from common import delta_days, create_redis_obj, get_day_nday_ago, get_dates_array, queue_process_concurrent_run
+from common import delta_days, create_redis_obj, get_day_nday_ago, get_dates_array, queue_process_concurrent_run, is_redis_member, get_quarter_ranges
 class RIndexStock:
     def __init__(self, dbinfo = ct.DB_INFO, redis_host = None):
         self.redis = create_redis_obj() if redis_host is None else create_redis_obj(host = redis_host)
@@ -20,6 +22,7 @@ class RIndexStock:
         self.redis_host = redis_host
         self.logger = getLogger(__name__)
         self.mysql_client = CMySQL(dbinfo, self.dbname, iredis = self.redis)
+        self.lake = CDataLake(self.dbname) if ct.USE_DATA_LAKE else None
         if not self.mysql_client.create_db(self.get_dbname()): raise Exception("init rstock database failed")
 
     @staticmethod
@@ -31,14 +34,17 @@ class RIndexStock:
         return "%s_day_%s_%s" % (self.get_dbname(), cdates[0], (int(cdates[1])-1)//3 + 1)
 
     def is_date_exists(self, table_name, cdate):
-        if self.redis.exists(table_name):
-            return cdate in set(str(tdate, encoding = "utf8") for tdate in self.redis.smembers(table_name))
-        return False
+        return is_redis_member(self.redis, table_name, cdate)
+
+    def get_existed_dates(self, table_name):
+        return set(str(tdate, encoding = "utf8") for tdate in self.redis.smembers(table_name))
+
+    def get_quarter_start_date(self, table_name):
+        year, quarter = table_name.split('_')[-2:]
+        return "%s-%02d-01" % (year, 3 * int(quarter) - 2)
 
     def is_table_exists(self, table_name):
-        if self.redis.exists(self.dbname):
-            return table_name in set(str(table, encoding = "utf8") for table in self.redis.smembers(self.dbname))
-        return False
+        return is_redis_member(self.redis, self.dbname, table_name)
 
     def create_table(self, table):
         sql = 'create table if not exists %s(date varchar(10) not null,\
@@ -71,100 +77,194 @@ class RIndexStock:
                                              pday int,\
                                              profit float,\
                                              gamekline float,\
-                                             PRIMARY KEY (date, code))' % table
-        return True if table in self.mysql_client.get_all_tables() else self.mysql_client.create(sql, table)
-
-    def get_k_data_in_range(self, start_date, end_date):
-        ndays = delta_days(start_date, end_date)
-        date_dmy_format = time.strftime("%m/%d/%Y", time.strptime(start_date, "%Y-%m-%d"))
-        data_times = pd.date_range(date_dmy_format, periods=ndays, freq='D')
-        date_only_array = np.vectorize(lambda s: s.strftime('%Y-%m-%d'))(data_times.to_pydatetime())
-        data_dict = OrderedDict()
-        for _date in date_only_array:
-            if CCalendar.is_trading_day(_date, redis = self.redis):
-                table_name = self.get_table_name(_date)
-                if table_name not in data_dict: data_dict[table_name] = list()
-                data_dict[table_name].append(str(_date))
-        all_df = pd.DataFrame()
-        for key in data_dict:
-            table_list = sorted(data_dict[key], reverse=False)
-            if len(table_list) == 1:
-                df = self.get_data(table_list[0])
-                if df is not None: all_df = all_df.append(df)
+                                             PRIMARY KEY (date, code),\
+                                             KEY %s (%s))' % (table, ct.RINDEX_COVERING_INDEX, ', '.join(ct.RINDEX_COVERING_COLUMNS))
+        if table in self.mysql_client.get_all_tables(): return self.create_covering_index(table)
+        if not self.mysql_client.create(sql, table): return False
+        self.redis.sadd(ct.RINDEX_INDEXED_TABLES, table)
+        return True
+
+    def has_covering_index(self, table):
+        df = self.mysql_client.get("show index from %s where Key_name = '%s'" % (table, ct.RINDEX_COVERING_INDEX))
+        return df is not None and not df.empty
+
+    def create_covering_index(self, table):
+        #for tables created before the covering index, secondary index of innodb contains the primary key (date, code)
+        if is_redis_member(self.redis, ct.RINDEX_INDEXED_TABLES, table): return True
+        if not self.has_covering_index(table):
+            sql = 'alter table %s add index %s (%s)' % (table, ct.RINDEX_COVERING_INDEX, ', '.join(ct.RINDEX_COVERING_COLUMNS))
+            if not self.mysql_client.exec_sql(sql): return False
+        self.redis.sadd(ct.RINDEX_INDEXED_TABLES, table)
+        return True
+
+    def migrate_covering_index(self):
+        #one-off migration of the quarter tables created before the covering index, run it by: python rstock.py migrate,
+        #update does not call it because it may alter every quarter table
+        succeed = True
+        for table in self.mysql_client.get_all_tables():
+            if not self.create_covering_index(table):
+                self.logger.error("create covering index for %s failed" % table)
+                succeed = False
+        return succeed
+
+    def get_k_data_in_range(self, start_date, end_date, columns = None, where = list()):
+        #quarters in the data lake are read locally, the others with one UNION ALL query
+        df_list = list()
+        mysql_ranges = list()
+        for table_name, qstart, qend in get_quarter_ranges(start_date, end_date, self.get_table_name):
+            if not self.is_table_exists(table_name): continue
+            df = None
+            if self.lake is not None and self.lake.is_table_exists(table_name): df = self.lake.get(table_name, qstart, qend, columns, where)
+            if df is None:
+                mysql_ranges.append((table_name, qstart, qend))
             else:
-                start_date = table_list[0]
-                end_date = table_list[len(table_list) - 1]
-                df = self.get_data_between(start_date, end_date)
-                if df is not None: all_df = all_df.append(df)
-        return all_df
+                df_list.append(df)
+        if len(mysql_ranges) > 0:
+            df = self.mysql_client.get_in_ranges(mysql_ranges, columns, where)
+            if df is not None: df_list.append(df)
+        if len(df_list) == 0: return pd.DataFrame()
+        all_df = pd.concat(df_list, ignore_index = True, sort = False)
+        #the UNION ALL query has no order, so a single frame is sorted as well
+        if not set(['date', 'code']).issubset(all_df.columns): return all_df
+        all_df = all_df.sort_values(by = ['date', 'code'], ascending = True, kind = 'mergesort')
+        return all_df.reset_index(drop = True)
 
-    def get_data_between(self, start_date, end_date):
+    def get_data_between(self, start_date, end_date, columns = None, where = list()):
         #start_date and end_date should be in the same table
-        sql = "select * from %s where date between \"%s\" and \"%s\"" % (self.get_table_name(start_date), start_date, end_date)
-        return self.mysql_client.get(sql)
+        table_name = self.get_table_name(start_date)
+        if self.lake is not None and self.lake.is_table_exists(table_name):
+            df = self.lake.get(table_name, start_date, end_date, columns, where)
+            if df is not None: return df
+        return self.mysql_client.select(table_name, columns, [('date', '>=', start_date), ('date', '<=', end_date)] + list(where))
 
-    def get_data(self, cdate = datetime.now().strftime('%Y-%m-%d')):
-        sql = "select * from %s where date=\"%s\"" % (self.get_table_name(cdate), cdate)
-        return self.mysql_client.get(sql)
+    def get_data(self, cdate = datetime.now().strftime('%Y-%m-%d'), columns = None, where = list()):
+        #columns and where are pushed down to the data lake or mysql, where is a list of (column, operator, value)
+        table_name = self.get_table_name(cdate)
+        if self.lake is not None and self.lake.is_table_exists(table_name):
+            df = self.lake.get(table_name, cdate, cdate, columns, where)
+            if df is not None and not df.empty: return df
+        return self.mysql_client.select(table_name, columns, [('date', '=', cdate)] + list(where))
 
-    def get_stock_data(self, cdate, code):
-        return (code, CStock(code).get_k_data(cdate))
+    def get_stock_data(self, start_date, end_date, code):
+        return (code, CStock(code).get_k_data_in_range(start_date, end_date))
 
     def generate_all_data_1(self, cdate, black_list = list()):
         failed_list = CStockInfo(redis_host = self.redis_host).get(redis = self.redis).code.tolist()
         if len(black_list) > 0: failed_list = list(set(failed_list).difference(set(black_list)))
-        cfunc = partial(self.get_stock_data, cdate)
+        cfunc = partial(self.get_stock_data, cdate, cdate)
         return queue_process_concurrent_run(cfunc, failed_list, redis_client = self.redis)
 
     def generate_all_data(self, cdate, black_list = ct.BLACK_LIST):
+        return self.generate_panel(cdate, cdate, black_list)
+
+    def generate_panel(self, start_date, end_date, black_list = ct.BLACK_LIST, retry_times = 3):
+        #read the history of every stock in [start_date, end_date] once, stack them into a (date, code) ordered panel
         from gevent.pool import Pool
         obj_pool = Pool(500)
         failed_list = CStockInfo(redis_host = self.redis_host).get(redis = self.redis).code.tolist()
         if len(black_list) > 0:
             failed_list = list(set(failed_list).difference(set(black_list)))
-        all_df = pd.DataFrame()
-        last_length = len(failed_list)
-        cfunc = partial(self.get_stock_data, cdate)
-        while last_length > 0:
-            self.logger.info("all stock list:%s, cdate:%s", len(failed_list), cdate)
-            for code_data in obj_pool.imap_unordered(cfunc, failed_list):
-                if code_data[1] is not None:
-                    tem_df = code_data[1]
-                    tem_df['code'] = code_data[0]
-                    all_df = all_df.append(tem_df)
-                    failed_list.remove(code_data[0])
-            if len(failed_list) != last_length:
-                self.logger.debug("last failed list:%s, current failed list:%s" % (last_length, len(failed_list)))
-                last_length = len(failed_list)
-                if last_length > 0: time.sleep(600)
+        data_dict = dict()
+        cfunc = partial(self.get_stock_data, start_date, end_date)
+        for i in range(retry_times):
+            self.logger.info("all stock list:%s, start date:%s, end date:%s", len(failed_list), start_date, end_date)
+            for code, tem_df in obj_pool.imap_unordered(cfunc, failed_list):
+                if tem_df is not None:
+                    data_dict[code] = tem_df
+                    failed_list.remove(code)
+            if len(failed_list) == 0: break
+            if i < retry_times - 1: time.sleep(ct.SHORT_SLEEP_TIME * (i + 1))
         obj_pool.join(timeout = 5)
         obj_pool.kill()
-        all_df = all_df.drop_duplicates()
-        all_df = all_df.sort_values(by = 'date', ascending= True)
-        all_df = all_df.reset_index(drop = True)
+        if len(failed_list) > 0:
+            self.logger.error("get data failed for %s, start date:%s, end date:%s" % (failed_list, start_date, end_date))
+            return None
+        return self.to_panel(data_dict)
+
+    @staticmethod
+    def to_panel(data_dict):
+        #every column is pivoted into a date-major, code-minor (dates, codes) array, the cells of a stock without
+        #the date are dropped, so the rows come out ordered by (date, code) without concat and sort of all frames
+        data_dict = {code: df.drop_duplicates(subset = ['date']) for code, df in data_dict.items() if not df.empty}
+        if len(data_dict) == 0: return pd.DataFrame()
+        codes = np.array(sorted(data_dict.keys()), dtype = object)
+        dates = np.unique(np.concatenate([df.date.values.astype(str) for df in data_dict.values()])).astype(object)
+        columns = list(OrderedDict.fromkeys(column for df in data_dict.values() for column in df.columns if column != 'code'))
+        present = np.zeros((len(dates), len(codes)), dtype = bool)
+        panel = dict()
+        for column in columns:
+            dtypes = [df[column].dtype for df in data_dict.values() if column in df.columns]
+            dtype = np.result_type(*dtypes) if all(dtype.kind in 'biuf' for dtype in dtypes) else np.dtype(object)
+            #a stock without the column is null, the same as concat
+            if dtype.kind in 'biu' and len(dtypes) < len(data_dict): dtype = np.dtype(float)
+            panel[column] = np.full((len(dates), len(codes)), np.nan if dtype.kind in 'fO' else 0, dtype = dtype)
+        for index, code in enumerate(codes):
+            df = data_dict[code]
+            rows = np.searchsorted(dates, df.date.values.astype(str))
+            present[rows, index] = True
+            for column in df.columns:
+                if column != 'code': panel[column][rows, index] = df[column].values
+        date_index, code_index = np.nonzero(present)
+        all_df = pd.DataFrame(OrderedDict((column, panel[column][present]) for column in columns))
+        all_df['date'] = dates[date_index]
+        all_df['code'] = codes[code_index]
         return all_df
 
     def update(self, end_date = datetime.now().strftime('%Y-%m-%d'), num = 30):
         #if end_date == datetime.now().strftime('%Y-%m-%d'): end_date = get_day_nday_ago(end_date, num = 1, dformat = "%Y-%m-%d")
         start_date = get_day_nday_ago(end_date, num = num, dformat = "%Y-%m-%d")
-        date_array = get_dates_array(start_date, end_date)
+        data_dict = OrderedDict()
+        for mdate in CCalendar.get_trading_days(start_date, end_date, asending = True, redis = self.redis):
+            table_name = self.get_table_name(mdate)
+            if table_name not in data_dict: data_dict[table_name] = list()
+            data_dict[table_name].append(str(mdate))
         succeed = True
-        count = 0
-        for mdate in date_array:
-            count += 1
-            if CCalendar.is_trading_day(mdate, redis = self.redis):
-                if not self.set_day_data(mdate):
-                    self.logger.error("set %s data for rstock failed" % mdate)
+        for table_name, date_list in data_dict.items():
+            if len(date_list) == 1:
+                if not self.set_day_data(date_list[0]):
+                    self.logger.error("set %s data for rstock failed" % date_list[0])
                     succeed = False
+            elif not self.set_quarter_data(table_name, date_list):
+                self.logger.error("set %s data for rstock failed" % table_name)
+                succeed = False
         return succeed
 
-    def set_day_data(self, cdate):
-        table_name = self.get_table_name(cdate)
+    def create_quarter_table(self, table_name):
         if not self.is_table_exists(table_name):
             if not self.create_table(table_name):
                 self.logger.error("create tick table failed")
                 return False
             self.redis.sadd(self.dbname, table_name)
+        return True
+
+    def set_quarter_data(self, table_name, date_list):
+        #build the panel of the quarter once instead of reading all stocks for every date
+        if not self.create_quarter_table(table_name): return False
+        existed_dates = self.get_existed_dates(table_name)
+        missing_dates = [mdate for mdate in date_list if mdate not in existed_dates]
+        if len(missing_dates) == 0: return True
+        df = self.generate_panel(self.get_quarter_start_date(table_name), date_list[-1])
+        if df is None: return False
+        missing_df = df.loc[df.date.isin(missing_dates)]
+        if not missing_df.empty:
+            if not self.mysql_client.set(missing_df, table_name): return False
+            self.redis.sadd(table_name, *set(missing_df.date.tolist()))
+        #the panel starts from the quarter start, the lake only keeps the dates recorded in mysql
+        recorded_dates = existed_dates.union(set(missing_df.date.tolist()))
+        if self.lake is not None and existed_dates.issubset(set(df.date.tolist())):
+            self.lake.set(df.loc[df.date.isin(recorded_dates)], table_name, keys = ['date', 'code'])
+        return True
+
+    def set_lake_data(self, df, table_name, cdate):
+        #the lake table of a quarter is kept only when it has all dates of mysql table
+        if self.lake is None: return True
+        if self.lake.is_table_exists(table_name): return self.lake.append(df, table_name)
+        if self.get_existed_dates(table_name) == set([cdate]): return self.lake.set(df, table_name, keys = ['date', 'code'])
+        return True
+
+    def set_day_data(self, cdate):
+        table_name = self.get_table_name(cdate)
+        if not self.create_quarter_table(table_name): return False
         if self.is_date_exists(table_name, cdate): 
             self.logger.debug("existed table:%s, date:%s" % (table_name, cdate))
             return True
@@ -172,9 +272,13 @@ class RIndexStock:
         if df is None: return False
         if self.mysql_client.set(df, table_name):
             self.redis.sadd(table_name, cdate)
+            self.set_lake_data(df, table_name, cdate)
             return True
         return False
 
 if __name__ == '__main__':
     ris = RIndexStock(ct.OUT_DB_INFO, redis_host = '127.0.0.1')
-    ris.update(end_date = '2019-03-16', num = 20000)
+    if len(sys.argv) > 1 and sys.argv[1] == 'migrate':
+        ris.migrate_covering_index()
+    else:
+        ris.update(end_date = '2019-03-16', num = 20000)
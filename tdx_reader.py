@@ -0,0 +1,118 @@
+#coding=utf-8
+import os
+import glob
+import const as ct
+import numpy as np
+import pandas as pd
+from collections import OrderedDict
+from base.clog import getLogger
+logger = getLogger(__name__)
+DAY_COLUMNS = ['date', 'open', 'high', 'close', 'low', 'amount', 'volume']
+#record of the native .day file, prices are in 0.01 yuan
+DAY_RECORD_DTYPE = np.dtype([('date', '<u4'), ('open', '<u4'), ('high', '<u4'), ('low', '<u4'), ('close', '<u4'), ('amount', '<f4'), ('volume', '<u4'), ('reserved', '<u4')])
+class CTdxReader:
+    #daily files of tdx (exported .csv or native .day) are parsed once into a structured array saved in cache_dir,
+    #the cache file is keyed by the mtime and size of the source file and read by memory map,
+    #so a single day is found by binary search without parsing the file again.
+    #clean data drops the days without volume or amount and keeps the first row of a date, the same as CStock.read
+    def __init__(self, cache_dir = ct.TDX_CACHE_DIR, cache_size = ct.TDX_CACHE_SIZE):
+        self.cache_dir = cache_dir
+        self.cache_size = cache_size
+        self.arrays = OrderedDict()
+
+    @staticmethod
+    def get_kind(clean):
+        return 'clean' if clean else 'raw'
+
+    def get_cache_file(self, filename, stat, clean):
+        return os.path.join(self.cache_dir, "%s.%s.%s_%s.npy" % (os.path.basename(filename), self.get_kind(clean), stat.st_mtime_ns, stat.st_size))
+
+    @staticmethod
+    def parse(filename):
+        if filename.endswith('.day'):
+            records = np.fromfile(filename, dtype = DAY_RECORD_DTYPE)
+            data = np.empty(len(records), dtype = [('date', np.int64), ('open', np.float64), ('high', np.float64), ('close', np.float64),
+                                                   ('low', np.float64), ('amount', np.float64), ('volume', np.int64)])
+            data['date'] = records['date']
+            for column in ['open', 'high', 'close', 'low']: data[column] = records[column] / 100.0
+            data['amount'] = records['amount']
+            data['volume'] = records['volume']
+            return data
+        return pd.read_csv(filename, sep = ',', usecols = DAY_COLUMNS).to_records(index = False)
+
+    @staticmethod
+    def sort(data, clean):
+        if clean:
+            data = data[(data['volume'] > 0) & (data['amount'] > 0)]
+            _, first_indexes = np.unique(data['date'], return_index = True)
+            return data[first_indexes]
+        return data[np.argsort(data['date'], kind = 'mergesort')]
+
+    def save(self, data, cache_file):
+        #the caches of other keys of the file are removed, the new one is written to a temporary file first,
+        #a cache of the same key may be written or removed by another process at the same time
+        prefix = cache_file.rsplit('.', 2)[0]
+        try:
+            os.makedirs(self.cache_dir, exist_ok = True)
+            for stale_file in glob.glob("%s.*.npy" % glob.escape(prefix)):
+                if stale_file == cache_file: continue
+                try:
+                    os.remove(stale_file)
+                except FileNotFoundError:
+                    pass
+            tmp_file = "%s.tmp.%s" % (cache_file, os.getpid())
+            with open(tmp_file, 'wb') as f: np.save(f, data)
+            os.replace(tmp_file, cache_file)
+            return True
+        except Exception as e:
+            logger.error("save tdx cache %s failed:%s" % (cache_file, e))
+            return False
+
+    @staticmethod
+    def load(cache_file):
+        #None if the cache is missing, it may be removed by another process after the check
+        try:
+            return np.load(cache_file, mmap_mode = 'r')
+        except FileNotFoundError:
+            return None
+
+    def get(self, filename, clean = False):
+        #structured array sorted by date, None if the file does not exist
+        try:
+            stat = os.stat(filename)
+        except OSError:
+            return None
+        key = (filename, clean)
+        cache_file = self.get_cache_file(filename, stat, clean)
+        if key in self.arrays and self.arrays[key][0] == cache_file:
+            self.arrays.move_to_end(key)
+            return self.arrays[key][1]
+        data = self.load(cache_file)
+        if data is None:
+            parsed = self.sort(self.parse(filename), clean)
+            if self.save(parsed, cache_file): data = self.load(cache_file)
+            if data is None: data = parsed
+        self.arrays[key] = (cache_file, data)
+        self.arrays.move_to_end(key)
+        while len(self.arrays) > self.cache_size: self.arrays.popitem(last = False)
+        return data
+
+    @staticmethod
+    def to_frame(data, index = None):
+        #columns are in the order of the file
+        return pd.DataFrame({column: np.array(data[column]) for column in data.dtype.names}, columns = list(data.dtype.names), index = index)
+
+    def get_frame(self, filename, clean = False):
+        data = self.get(filename, clean)
+        return pd.DataFrame(columns = DAY_COLUMNS) if data is None else self.to_frame(data)
+
+    def get_day(self, filename, cdate):
+        #clean data of cdate (int YYYYMMDD) with its position as index and the date before it, (empty frame, None) if it is missing
+        data = self.get(filename, clean = True)
+        if data is None: return pd.DataFrame(), None
+        pos = int(np.searchsorted(data['date'], cdate, 'left'))
+        if pos == len(data) or data['date'][pos] != cdate: return pd.DataFrame(), None
+        pre_date = int(data['date'][pos - 1]) if pos > 0 else None
+        return self.to_frame(data[pos:pos + 1], index = [pos]), pre_date
+
+tdx_reader = CTdxReader()
@@ -0,0 +1,50 @@
+#coding=utf-8
+import os
+import sys
+from os.path import abspath, dirname
+sys.path.insert(0, dirname(dirname(abspath(__file__))))
+os.environ.setdefault('dockerhost', '127.0.0.1')
+import numpy as np
+import pandas as pd
+from cdatalake import CDataLake
+def get_data(dates, names):
+    return pd.DataFrame({'date': dates, 'close': np.arange(len(dates), dtype = float), 'volume': np.arange(len(dates)), 'name': names})
+
+def test_nulls_are_kept(tmp_path):
+    lake = CDataLake('s000001', root = str(tmp_path))
+    assert lake.set(get_data(['2020-01-02', '2020-01-03', '2020-01-06'], ['a', None, 'None']), 'day')
+    df = lake.get('day')
+    assert df['name'].tolist() == ['a', None, 'None']
+    assert lake.get('day', where = [('name', '!=', 'a')])['date'].tolist() == ['2020-01-06']
+
+def test_append_with_null_of_int_rewrites(tmp_path):
+    lake = CDataLake('s000001', root = str(tmp_path))
+    assert lake.set(get_data(['2020-01-02', '2020-01-03'], ['a', 'b']), 'day')
+    date_file = lake.get_column_file('day', 'date')
+    inode = os.stat(date_file).st_ino
+    assert lake.append(get_data(['2020-01-06'], [None]).drop(columns = ['volume']), 'day')
+    df = lake.get('day')
+    assert df['date'].tolist() == ['2020-01-02', '2020-01-03', '2020-01-06']
+    assert df['name'].tolist() == ['a', 'b', None]
+    #volume is int, a null of it does not fit and the table is rewritten
+    assert np.isnan(df['volume'].values[-1])
+    assert os.stat(date_file).st_ino != inode
+
+def test_append_before_last_date_rewrites(tmp_path):
+    lake = CDataLake('s000001', root = str(tmp_path))
+    assert lake.set(get_data(['2020-01-02', '2020-01-06'], ['a', 'c']), 'day')
+    assert lake.append(get_data(['2020-01-03', '2020-01-06'], ['b', 'd']), 'day')
+    df = lake.get('day')
+    assert df['date'].tolist() == ['2020-01-02', '2020-01-03', '2020-01-06']
+    assert df['name'].tolist() == ['a', 'b', 'd']
+
+def test_append_writes_only_new_rows(tmp_path):
+    lake = CDataLake('s000001', root = str(tmp_path))
+    assert lake.set(get_data(['2020-01-02'], ['a']), 'day')
+    inode = os.stat(lake.get_column_file('day', 'close')).st_ino
+    for i, cdate in enumerate(['2020-01-03', '2020-01-06', '2020-01-07']):
+        assert lake.append(get_data([cdate], ['bcd'[i]]), 'day')
+    assert os.stat(lake.get_column_file('day', 'close')).st_ino == inode
+    df = lake.get('day', start_date = '2020-01-03')
+    assert df['name'].tolist() == ['b', 'c', 'd']
+    assert df['volume'].dtype == np.int64
@@ -0,0 +1,34 @@
+#coding=utf-8
+import os
+import sys
+import time
+from os.path import abspath, dirname
+sys.path.insert(0, dirname(dirname(abspath(__file__))))
+os.environ.setdefault('dockerhost', '127.0.0.1')
+from base.cpipeline import CStagePipeline
+def read_item(item):
+    return True, item
+
+def compute_item(item, data):
+    #longer than the 1 second poll of wait_result
+    if item == 0: time.sleep(1.5)
+    if item == 2: os._exit(1)
+    return data * 10
+
+def test_slow_compute_is_not_failed():
+    results = dict()
+    def write_item(item, result):
+        results[item] = result
+        return True
+    pipeline = CStagePipeline(read_item, compute_item, write_item, process_num = 2, read_num = 2, write_num = 1)
+    assert pipeline.run([0, 1, 3]) == []
+    assert results == {0: 0, 1: 10, 3: 30}
+
+def test_crashed_compute_is_failed():
+    results = dict()
+    def write_item(item, result):
+        results[item] = result
+        return True
+    pipeline = CStagePipeline(read_item, compute_item, write_item, process_num = 2, read_num = 2, write_num = 1)
+    assert pipeline.run([0, 1, 2, 3]) == [2]
+    assert results == {0: 0, 1: 10, 3: 30}
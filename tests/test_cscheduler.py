@@ -0,0 +1,77 @@
+#coding=utf-8
+import os
+import sys
+import time
+from os.path import abspath, dirname
+sys.path.insert(0, dirname(dirname(abspath(__file__))))
+os.environ.setdefault('dockerhost', '127.0.0.1')
+import numpy as np
+import pandas as pd
+from functools import partial
+from base.cscheduler import CTaskScheduler, to_record_batch, from_record_batch
+def record(dirname, item):
+    #the workers are processes, every try of a task is a line of its file
+    with open(os.path.join(dirname, str(item)), 'a') as f:
+        f.write("%s\n" % os.getpid())
+
+def get_tries(dirname, item):
+    path = os.path.join(dirname, str(item))
+    if not os.path.exists(path): return 0
+    with open(path) as f:
+        return len(f.readlines())
+
+def run_item(dirname, item):
+    record(dirname, item)
+    if item == 'crash': os._exit(1)
+    if item == 'hang':
+        while True: pass
+    return item, item != 'fail'
+
+def test_failed_task_is_dead_letter_after_retries(tmp_path):
+    dirname = str(tmp_path)
+    scheduler = CTaskScheduler(partial(run_item, dirname), process_num = 2, num = 2, max_retry_times = 2, backoff = 0.1)
+    assert scheduler.run(['fail', 'a', 'b', 'c']) == ['fail']
+    assert get_tries(dirname, 'fail') == 3
+    for item in ['a', 'b', 'c']: assert get_tries(dirname, item) == 1
+
+def test_retry_waits_for_backoff(tmp_path):
+    dirname = str(tmp_path)
+    start_time = time.time()
+    scheduler = CTaskScheduler(partial(run_item, dirname), process_num = 1, num = 1, max_retry_times = 2, backoff = 0.5)
+    assert scheduler.run(['fail']) == ['fail']
+    #0.5 before the second try and 1 before the third one
+    assert time.time() - start_time >= 1.5
+
+def test_unstarted_tasks_of_crashed_worker_keep_their_attempt(tmp_path):
+    #without retries a task which lost its try to the crash would be a dead letter
+    dirname = str(tmp_path)
+    items = ['crash'] + [str(i) for i in range(8)]
+    scheduler = CTaskScheduler(partial(run_item, dirname), process_num = 1, num = 1, prefetch = 8, max_retry_times = 0)
+    assert scheduler.run(items) == ['crash']
+    assert get_tries(dirname, 'crash') == 1
+    for item in items[1:]: assert get_tries(dirname, item) == 1
+
+def test_hanging_worker_is_killed(tmp_path):
+    dirname = str(tmp_path)
+    start_time = time.time()
+    scheduler = CTaskScheduler(partial(run_item, dirname), process_num = 2, num = 1, timeout = 1, kill_grace = 0.5, max_retry_times = 1, backoff = 0.1)
+    assert scheduler.run(['hang', 'a', 'b']) == ['hang']
+    assert get_tries(dirname, 'hang') == 2
+    assert get_tries(dirname, 'a') == 1
+    assert get_tries(dirname, 'b') == 1
+    assert time.time() - start_time < 30
+
+def test_record_batch_keeps_nulls(tmp_path):
+    df = pd.DataFrame({'name': ['a', None, np.nan, 'None', ''], 'close': [1.5, np.nan, 2.5, None, 3.0],
+                       'volume': [1, 2, 3, 4, 5], 'count': [1, None, 3, 4, 5], 'code': ['1', '2', '3', '4', '5'], 'memo': [None] * 5})
+    path = str(tmp_path / 'batch.npy')
+    np.save(path, to_record_batch(df))
+    #a batch is loaded without pickle
+    result = from_record_batch(np.load(path))
+    assert result.columns.tolist() == df.columns.tolist()
+    assert result['name'].tolist() == ['a', None, None, 'None', '']
+    assert result['code'].tolist() == df['code'].tolist()
+    assert result['memo'].tolist() == [None] * 5
+    for column in ['close', 'volume', 'count']:
+        assert result[column].dtype == df[column].dtype
+        np.testing.assert_array_equal(result[column].values, df[column].values)
@@ -0,0 +1,39 @@
+#coding=utf-8
+import os
+import sys
+from os.path import abspath, dirname
+sys.path.insert(0, dirname(dirname(abspath(__file__))))
+os.environ.setdefault('dockerhost', '127.0.0.1')
+import pytest
+import pandas as pd
+#cstock needs the database clients and the built extensions of the repo
+for name in ['tushare', 'redis', 'MySQLdb', 'sqlalchemy', 'influxdb', 'wget', 'requests', 'cpython.cchip']: pytest.importorskip(name)
+from cstock import CStock
+A = ('09:30:00', 10.01, 0.01, 100, 100100.0, '买入')
+B = ('09:30:20', 10.01, 0.00, 200, 200200.0, '卖出')
+C = ('09:30:40', 10.02, 0.01, 300, 300600.0, '买入')
+def get_ticket(rows):
+    return pd.DataFrame(rows, columns = ['time', 'price', 'cchange', 'volume', 'amount', 'ctype'])
+
+def test_merge_ticket_without_runs_keeps_rows():
+    df = get_ticket([A, B, C])
+    pd.testing.assert_frame_equal(CStock.merge_ticket(df.copy()), df)
+
+def test_merge_ticket_multiplies_by_run_length():
+    #the rows of a run are counted once each, a run of three gives three times the volume
+    df = CStock.merge_ticket(get_ticket([A, A, A, B, C]))
+    assert df['time'].tolist() == ['09:30:00', '09:30:20', '09:30:40']
+    assert df['volume'].tolist() == [300, 200, 300]
+    assert df['amount'].tolist() == [300300.0, 200200.0, 300600.0]
+    assert df.index.tolist() == [0, 1, 2]
+
+def test_merge_ticket_merges_runs_in_the_middle():
+    df = CStock.merge_ticket(get_ticket([B, A, A, A, A, C, C]))
+    assert df['time'].tolist() == ['09:30:20', '09:30:00', '09:30:40']
+    assert df['volume'].tolist() == [200, 400, 600]
+    assert df['amount'].tolist() == [200200.0, 400400.0, 601200.0]
+
+def test_merge_ticket_keeps_equal_rows_apart():
+    df = CStock.merge_ticket(get_ticket([A, B, A, A, C, A]))
+    assert df['time'].tolist() == ['09:30:00', '09:30:20', '09:30:00', '09:30:40', '09:30:00']
+    assert df['volume'].tolist() == [100, 200, 200, 300, 100]
@@ -0,0 +1,33 @@
+#coding=utf-8
+import os
+import sys
+import struct
+from os.path import abspath, dirname
+sys.path.insert(0, dirname(dirname(abspath(__file__))))
+os.environ.setdefault('dockerhost', '127.0.0.1')
+import pytest
+import pandas as pd
+#ticks needs the download dependencies of the repo
+for name in ['wget', 'requests', 'tushare', 'redis']: pytest.importorskip(name)
+import ticks
+import legacy_ticks
+#synthetic ticks of 2019-01-02 built from the real hash tables, with long price codes, every volume prefix,
+#a stock of one tick and a stock without tick data
+TIC_FILE = os.path.join(dirname(abspath(__file__)), 'data', '20190102.tic')
+def read_items(filename):
+    items = list()
+    with open(filename, 'rb') as fobj:
+        stock_count = struct.unpack('<h', fobj.read(2))[0]
+        for _ in range(stock_count):
+            (market, code, _, date, t_size, pre_close) = struct.unpack("B6s1siif", fobj.read(20))
+            items.append((market, code.decode(), fobj.read(t_size)))
+    return items
+
+def test_decoders_give_equal_frames():
+    items = read_items(TIC_FILE)
+    assert len(items) == 5
+    for market, code, raw_tick_data in items:
+        if len(raw_tick_data) == 20: continue
+        ttd_list = legacy_ticks.parse_tick_item(raw_tick_data, code)
+        expected = pd.DataFrame([{'time': ttd.dtime, 'price': ttd.price, 'volume': ttd.volume, 'type': ttd.type} for ttd in ttd_list])
+        pd.testing.assert_frame_equal(pd.DataFrame(ticks.parse_tick_item(raw_tick_data, code)), expected)
@@ -3,9 +3,10 @@ import warnings
 warnings.filterwarnings("ignore", message="numpy.dtype size changed")
 warnings.filterwarnings("ignore", message="numpy.ufunc size changed")
 import os
+import glob
+import mmap
 import time
 import wget
-import ctypes
 import struct
 import zipfile
 import datetime
@@ -13,183 +14,131 @@ import requests
 import const as ct
 import numpy as np
 import pandas as pd
+from functools import partial
+from collections import OrderedDict
 from datetime import datetime, timedelta
 from base.clog import getLogger
-from datamanager.tick_models import TickTradeDetail, TickDetailModel
+from base.cscheduler import CTaskScheduler
+from datamanager.tick_models import TickDetailModel
 from common import get_security_exchange_name, get_day_nday_ago
 logger = getLogger(__name__)
 pd.options.mode.chained_assignment = None #default='warn'
 pd.set_option('display.max_columns', None)
 pd.set_option('display.max_rows', None)
 
-def unsigned2signed(value):
-    return ctypes.c_int32(value).value
+BUY_TYPE = "买入"
+SELL_TYPE = "卖出"
+#bits peeked at once when a code is looked up, codes not longer than it are decoded by one table access
+PEEK_BITS = 8
+class CHashTable:
+    #decoding table of a huffman-like code, a code is the bits read after the prefix 0b11 until the value is in the table.
+    #values are compared by their low 32 bits, the same as the int32 checksum of tdx
+    def __init__(self, hash_table, exclude_zero = False):
+        self.values = dict()
+        for key, value in sorted(hash_table.items(), key = lambda x: int(x[1], 16)):
+            value = int(value, 16)
+            if exclude_zero and value == 0: continue
+            self.values.setdefault(value & 0xFFFFFFFF, key)
+        #peeks[bits] is (key, length) of the shortest code which is a prefix of the peeked bits, None if it is longer
+        self.peeks = list()
+        for bits in range(1 << PEEK_BITS):
+            peek = None
+            for length in range(1, PEEK_BITS + 1):
+                check = (3 << length) | (bits >> (PEEK_BITS - length))
+                if check in self.values:
+                    peek = (self.values[check], length)
+                    break
+            self.peeks.append(peek)
 
-def signed2unsigned(value, b = 32):
-    if 32 == b:
-        return ctypes.c_uint32(value).value
-    elif 8 == b:
-        return ctypes.c_uint8(value).value
-    elif 16 == b:
-        return ctypes.c_uint16(value).value
+class CBitReader:
+    #reads the bits of little endian 32 bit words from the highest one, the cursor moves over a memoryview
+    def __init__(self, data):
+        self.data = memoryview(data)
+        self.offset = 0
+        self.buf = 0
+        self.nbits = 0
 
-def int_overflow(val):
-    maxint = 2147483647
-    if not -maxint - 1 <= val <= maxint:
-        val = (val + (maxint + 1)) % (2 * (maxint + 1)) - maxint - 1
-    return val
+    def fill(self, nbits):
+        while self.nbits < nbits:
+            word = struct.unpack_from('<I', self.data, self.offset)[0]
+            self.offset += 4
+            self.buf = (self.buf << 32) | word
+            self.nbits += 32
 
-def unsigned_left_shitf(n,i):
-    if n < 0: n = ctypes.c_uint32(n).value
-    if i < 0: return int_overflow(n >> abs(i))
-    return int_overflow(n << i)
+    def read(self, nbits):
+        self.fill(nbits)
+        self.nbits -= nbits
+        value = self.buf >> self.nbits
+        self.buf &= (1 << self.nbits) - 1
+        return value
 
-def read4(tic_detail_bytes):
-    left = tic_detail_bytes[0:4]
-    tic_detail_bytes = tic_detail_bytes[4:]
-    return left, tic_detail_bytes
-
-def read1(tic_detail_bytes):
-    left = tic_detail_bytes[0:1]
-    tic_detail_bytes = tic_detail_bytes[1:]
-    return signed2unsigned(struct.unpack('b', left)[0], 8), tic_detail_bytes
-
-def read2(tic_detail_bytes):
-    left = tic_detail_bytes[0:2]
-    tic_detail_bytes = tic_detail_bytes[2:]
-    return signed2unsigned(struct.unpack('H', left)[0], 16), tic_detail_bytes
-
-def dict2list(cdic:dict):
-    keys = cdic.keys()
-    vals = cdic.values()
-    return [(key, val) for key, val in zip(keys, vals)]
+    def decode(self, table):
+        #at the end of data less than PEEK_BITS bits may be left, then the code is read bit by bit
+        try:
+            self.fill(PEEK_BITS)
+            peek = table.peeks[self.buf >> (self.nbits - PEEK_BITS)]
+            if peek is not None:
+                self.read(peek[1])
+                return peek[0]
+            check = (3 << PEEK_BITS) | self.read(PEEK_BITS)
+        except struct.error:
+            check = 3
+        while True:
+            check = ((check << 1) | self.read(1)) & 0xFFFFFFFF
+            if check in table.values: return table.values[check]
 
-def get_price_list(alist):
-    pos_list = [x for x in alist if int(x[1], 16) > 0]
-    pos_list = sorted(pos_list, key=lambda x: int(x[1], 16), reverse=False)
-    neg_list = [x for x in alist if int(x[1], 16) < 0]
-    neg_list = sorted(neg_list, key=lambda x: int(x[1], 16), reverse=False)
-    pos_list.extend(neg_list)
-    return pos_list
+time_table = None
+price_table = None
+def get_hash_tables():
+    #built once from const, price values which are 0 are never matched by tdx
+    global time_table, price_table
+    if time_table is None:
+        time_table = CHashTable(ct.HASH_TABLE_DATETIME)
+        price_table = CHashTable(ct.HASH_TABLE_PRICE, exclude_zero = True)
+    return time_table, price_table
 
-def parse_tick_price(ttd_list, tic_detail_bytes, tdm):
-    tmp_size = 32
-    time_list = sorted(dict2list(ct.HASH_TABLE_DATETIME), key=lambda x: int(x[1], 16), reverse=False)
-    price_list = get_price_list(dict2list(ct.HASH_TABLE_PRICE))
-    left, tic_detail_bytes = read4(tic_detail_bytes)
-    tick_data_item = struct.unpack('I', left)[0]
+def parse_tick_detail(td_bytes, tdm):
+    #returns the columns of time, price, volume and type
+    time_table, price_table = get_hash_tables()
+    escape_index = len(ct.HASH_TABLE_PRICE) - 1
+    times, prices, types = [tdm.dtime], [tdm.price], [BUY_TYPE if 0 == tdm.type >> 15 else SELL_TYPE]
+    reader = CBitReader(td_bytes)
     for _ in range(1, tdm.count):
         #解析类型
-        _type = unsigned_left_shitf(tick_data_item, -31)
-        _type = "买入" if 0 == _type else "卖出"
-		#解析时间
-        tick_data_item = unsigned_left_shitf(tick_data_item, 1)
-        tmp_size -= 1
-        if 0 == tmp_size:
-            left, tic_detail_bytes = read4(tic_detail_bytes)
-            tick_data_item = struct.unpack('I', left)[0]
-            tmp_size = 32
-        tmp_check_sum = 3
-        tmp_index, tick_data_item, tic_detail_bytes, tmp_size = time_recursion(tmp_check_sum, tick_data_item, tmp_size, tic_detail_bytes, time_list)
-        _time = ttd_list[len(ttd_list) - 1].dtime + tmp_index
-		#解析价格
-        tmp_check_sum = 3
-        tmp_index, tick_data_item, tic_detail_bytes, tmp_size = price_recursion(tmp_check_sum, tick_data_item, tmp_size, tic_detail_bytes, price_list)
-        if tmp_index != len(ct.HASH_TABLE_PRICE) - 1:
-            _price = ttd_list[len(ttd_list)-1].price + tmp_index
-        else:
-            tmp_check_sum = 0
-            tmp_index = 32
-            while tmp_index > 0:
-                tmp_index -= 1
-                tmp_check_sum = unsigned_left_shitf(tmp_check_sum, 1) | unsigned_left_shitf(tick_data_item, -31)
-                tick_data_item = unsigned_left_shitf(tick_data_item, 1)
-                tmp_size -= 1
-                if 0 == tmp_size:
-                    left, tic_detail_bytes = read4(tic_detail_bytes)
-                    tick_data_item = struct.unpack('I', left)[0]
-                    tmp_size = 32
-            _price = ttd_list[len(ttd_list)-1].price + tmp_index
-        ttd_list.append(TickTradeDetail(_time, _price, 0, _type))
-    return ttd_list
-
-def time_recursion(tmp_check_sum, tick_data_item, tmp_size, tic_detail_bytes, klist):
-    tmp_check_sum = unsigned_left_shitf(tmp_check_sum, 1) | unsigned_left_shitf(tick_data_item, -31)
-    tick_data_item = unsigned_left_shitf(tick_data_item, 1)
-    tmp_size -= 1
-    if 0 == tmp_size:
-        left, tic_detail_bytes = read4(tic_detail_bytes)
-        tick_data_item = struct.unpack('I', left)[0]
-        tmp_size = 32
-    tmp_index = 0
-    while int(klist[tmp_index][1], 16) != tmp_check_sum:
-        if int(klist[tmp_index][1], 16) < tmp_check_sum:
-            tmp_index += 1
-            if tmp_index < len(klist): continue
-        tmp_check_sum = unsigned_left_shitf(tmp_check_sum, 1) | unsigned_left_shitf(tick_data_item, -31)
-        tick_data_item = unsigned_left_shitf(tick_data_item, 1)
-        tmp_size -= 1
-        if 0 == tmp_size:
-            left, tic_detail_bytes = read4(tic_detail_bytes)
-            tick_data_item = struct.unpack('I', left)[0]
-            tmp_size = 32
-        tmp_index = 0
-    return klist[tmp_index][0], tick_data_item, tic_detail_bytes, tmp_size
-
-def price_recursion(tmp_check_sum, tick_data_item, tmp_size, tic_detail_bytes, klist):
-    tmp_check_sum = unsigned_left_shitf(tmp_check_sum, 1) | unsigned_left_shitf(tick_data_item, -31)
-    tick_data_item = unsigned_left_shitf(tick_data_item, 1)
-    tmp_size -= 1
-    if 0 == tmp_size:
-        left, tic_detail_bytes = read4(tic_detail_bytes)
-        tick_data_item = struct.unpack('I', left)[0]
-        tmp_size = 32
-    tmp_index = 0
-    while int(klist[tmp_index][1], 16) != tmp_check_sum:
-        if signed2unsigned(tmp_check_sum) > 0x3FFFFFF or int(klist[tmp_index][1], 16) <= tmp_check_sum:
-            tmp_index += 1
-            if tmp_index < len(klist): continue
-        tmp_check_sum = unsigned_left_shitf(tmp_check_sum, 1) | unsigned_left_shitf(tick_data_item, -31)
-        tick_data_item = unsigned_left_shitf(tick_data_item, 1)
-        tmp_size -= 1
-        if 0 == tmp_size:
-            left, tic_detail_bytes = read4(tic_detail_bytes)
-            tick_data_item = struct.unpack('I', left)[0]
-            tmp_size = 32
-        tmp_index = 0
-    return klist[tmp_index][0], tick_data_item, tic_detail_bytes, tmp_size
-                    
-def parse_tick_detail(td_bytes, tdm):
-    ttd_list = list()
-    _type = "买入" if 0 == unsigned_left_shitf(tdm.type, -15) else "卖出"
-    ttd = TickTradeDetail(tdm.dtime, tdm.price, tdm.volume, _type)
-    ttd_list.append(ttd)
-    #解析交易时间及价格信息
-    ttd_list = parse_tick_price(ttd_list, td_bytes, tdm)
+        types.append(BUY_TYPE if 0 == reader.read(1) else SELL_TYPE)
+        #解析时间
+        times.append(times[-1] + reader.decode(time_table))
+        #解析价格, tdx reads 32 bits after the escape code but does not use them
+        tmp_index = reader.decode(price_table)
+        if tmp_index == escape_index:
+            reader.read(32)
+            tmp_index = 0
+        prices.append(prices[-1] + tmp_index)
     #解析成交量
-    volume_buffer = td_bytes[tdm.vol_offset : (tdm.vol_offset + tdm.vol_size)]
-    for i in range(1, tdm.count):
-        result_vol = 0
-        byte_volume, volume_buffer = read1(volume_buffer)
+    volumes = [tdm.volume]
+    volume_buffer = memoryview(td_bytes)[tdm.vol_offset : (tdm.vol_offset + tdm.vol_size)]
+    pos = 0
+    for _ in range(1, tdm.count):
+        byte_volume = volume_buffer[pos]
+        pos += 1
         if byte_volume <= 252:
-            result_vol = int(byte_volume)
+            result_vol = byte_volume
         elif byte_volume == 253:
-            tmp_vol, volume_buffer = read1(volume_buffer)
-            result_vol = int(tmp_vol) + int(byte_volume)
-            result_vol = signed2unsigned(result_vol, 16)
+            result_vol = (volume_buffer[pos] + byte_volume) & 0xFFFF
+            pos += 1
         elif byte_volume == 254:
-            tmp_vol, volume_buffer = read2(volume_buffer)
-            result_vol = int(tmp_vol) + int(byte_volume)
+            result_vol = struct.unpack_from('<H', volume_buffer, pos)[0] + byte_volume
+            pos += 2
         else:
-            tmp_vol1, volume_buffer = read1(volume_buffer)
-            tmp_vol2, volume_buffer = read2(volume_buffer)
-            result_vol = int(0xFFFF * int(tmp_vol1) + int(tmp_vol2) + 0xFF)
-        ttd_list[i].volume = result_vol
-        ttd_list[i].dtime = set_trade_time(ttd_list[i].dtime)
-        ttd_list[i].price = ttd_list[i].price / 100
-    ttd_list[0].dtime = set_trade_time(-5)
-    ttd_list[0].price = ttd_list[0].price / 100
-    return ttd_list
+            result_vol = 0xFFFF * volume_buffer[pos] + struct.unpack_from('<H', volume_buffer, pos + 1)[0] + 0xFF
+            pos += 3
+        volumes.append(result_vol)
+    trade_times = dict()
+    times[0] = -5
+    for i in range(len(times)):
+        if times[i] not in trade_times: trade_times[times[i]] = set_trade_time(times[i])
+        times[i] = trade_times[times[i]]
+    return {'time': times, 'price': [price / 100 for price in prices], 'volume': volumes, 'type': types}
 
 def set_trade_time(time_val):
     result = time_val + 570 if time_val <= 120 else time_val + 660
@@ -201,56 +150,154 @@ def parse_tick_item(data, code):
     tick_item_bytes = data[:20]
     tic_detail_bytes = data[20:]
     (sdate, scount, svol_offset, svol_size, stype, sprice, svolume) = struct.unpack("iHHHHii", tick_item_bytes)
-    stime = ctypes.c_uint8(stype).value
+    stime = stype & 0xFF
     tdm = TickDetailModel(sdate, stime, sprice, svolume, scount, stype, svol_offset, svol_size)
     return parse_tick_detail(tic_detail_bytes, tdm)
 
+#header of the ticks of a stock in a .tic file
+TICK_HEADER = struct.Struct("B6s1siif")
+TICK_INDEX_DTYPE = np.dtype([('market', 'u1'), ('code', 'U6'), ('offset', '<i8'), ('size', '<i4'), ('pre_close', '<f4')])
+class CTickReader:
+    #a .tic file is the stock count followed by the header and the tick data of every stock,
+    #the headers are scanned once into an index of (market, code) -> (offset, size, pre_close) saved next to the file,
+    #the index file is keyed by the mtime and size of the .tic file, the data of a stock is sliced out of a memory map
+    def __init__(self, cache_size = ct.TICK_INDEX_CACHE_SIZE):
+        self.cache_size = cache_size
+        self.indexes = OrderedDict()
+
+    @staticmethod
+    def get_index_file(filename, stat):
+        return "%s.%s_%s.idx.npy" % (filename, stat.st_mtime_ns, stat.st_size)
+
+    @staticmethod
+    def scan(filename):
+        #only the headers are read, the tick data is skipped
+        entries = list()
+        with open(filename, 'rb') as fobj, mmap.mmap(fobj.fileno(), 0, access = mmap.ACCESS_READ) as mm:
+            stock_count = struct.unpack_from('<h', mm, 0)[0]
+            offset = 2
+            for _ in range(stock_count):
+                (market, code, _, date, t_size, pre_close) = TICK_HEADER.unpack_from(mm, offset)
+                offset += TICK_HEADER.size
+                entries.append((market, code.decode(), offset, t_size, pre_close))
+                offset += t_size
+        return np.array(entries, dtype = TICK_INDEX_DTYPE)
+
+    def save(self, data, index_file):
+        #the indexes of other keys of the file are removed, the new one is written to a temporary file first,
+        #an index of the same key may be written or removed by another process at the same time
+        prefix = index_file.rsplit('.', 3)[0]
+        try:
+            for stale_file in glob.glob("%s.*.idx.npy" % glob.escape(prefix)):
+                if stale_file == index_file: continue
+                try:
+                    os.remove(stale_file)
+                except FileNotFoundError:
+                    pass
+            tmp_file = "%s.tmp.%s" % (index_file, os.getpid())
+            with open(tmp_file, 'wb') as f: np.save(f, data)
+            os.replace(tmp_file, index_file)
+            return True
+        except Exception as e:
+            logger.error("save tick index %s failed:%s" % (index_file, e))
+            return False
+
+    @staticmethod
+    def load(index_file):
+        #None if the index is missing, it may be removed by another process after the check
+        try:
+            return np.load(index_file)
+        except FileNotFoundError:
+            return None
+
+    def get_index(self, filename):
+        #dict of (market, code) -> (offset, size, pre_close), the first one is kept for a duplicated code, None if the file does not exist
+        try:
+            stat = os.stat(filename)
+        except OSError:
+            return None
+        index_file = self.get_index_file(filename, stat)
+        if filename in self.indexes and self.indexes[filename][0] == index_file:
+            self.indexes.move_to_end(filename)
+            return self.indexes[filename][1]
+        data = self.load(index_file)
+        if data is None:
+            data = self.scan(filename)
+            self.save(data, index_file)
+        index = dict()
+        for market, code, offset, t_size, pre_close in data.tolist():
+            index.setdefault((market, code), (offset, t_size, pre_close))
+        self.indexes[filename] = (index_file, index)
+        self.indexes.move_to_end(filename)
+        while len(self.indexes) > self.cache_size: self.indexes.popitem(last = False)
+        return index
+
+    def read(self, filename, keys = None):
+        #generates (key, frame) of keys in the order of the file, all stocks of the file when keys is None
+        index = self.get_index(filename)
+        if index is None: return
+        keys = list(index.keys()) if keys is None else [key for key in keys if key in index]
+        keys.sort(key = lambda key: index[key][0])
+        with open(filename, 'rb') as fobj, mmap.mmap(fobj.fileno(), 0, access = mmap.ACCESS_READ) as mm:
+            for key in keys:
+                offset, t_size, pre_close = index[key]
+                yield key, get_tick_frame(mm[offset:offset + t_size], pre_close)
+
+tick_reader = CTickReader()
+
+def get_market_id(code_id):
+    return ct.MARKET_SH if 'sh' == get_security_exchange_name(code_id) else ct.MARKET_SZ
+
+def get_tick_frame(raw_tick_data, pre_close):
+    if len(raw_tick_data) == 20: return pd.DataFrame()
+    df = pd.DataFrame(parse_tick_item(raw_tick_data, None))
+    if df.empty: return pd.DataFrame()
+    df = adjust_time(df)
+    df['change'] = df['price'] - df["price"].shift(1)
+    df.at[0, 'change'] = df.loc[0]['price'] - pre_close
+    df['amount'] = df['price'] * df['volume']
+    df = df[['time','price','change','volume', 'amount', 'type']]
+    return df.round(2)
+
 def read_tick(filename, code_id):
-    if not os.path.exists(filename): return pd.DataFrame()
-    with open(filename, 'rb') as fobj:
-        market_id = ct.MARKET_SH if 'sh' == get_security_exchange_name(code_id) else ct.MARKET_SZ
-        stockCount = struct.unpack('<h', fobj.read(2))[0]
-        for idx in range(stockCount):
-            (market, code, _, date, t_size, pre_close) = struct.unpack("B6s1siif", fobj.read(20))
-            code = code.decode()
-            raw_tick_data = fobj.read(t_size)
-            if code == code_id and market == market_id:
-                if t_size == 20: return pd.DataFrame()
-                ttd_list = parse_tick_item(raw_tick_data, code)
-                if len(ttd_list) == 0: return pd.DataFrame()
-                dict_list = list()
-                for ttd in ttd_list:
-                    cdict = {'time': ttd.dtime, 'price': ttd.price, 'volume': ttd.volume, 'type': ttd.type}
-                    dict_list.append(cdict)
-                df = pd.DataFrame(dict_list)
-                df = adjust_time(df)
-                df['change'] = df['price'] - df["price"].shift(1)
-                df.at[0, 'change'] = df.loc[0]['price'] - pre_close
-                df['amount'] = df['price'] * df['volume']
-                df = df[['time','price','change','volume', 'amount', 'type']]
-                return df.round(2)
+    for _, df in tick_reader.read(filename, [(get_market_id(code_id), code_id)]): return df
     return pd.DataFrame()
 
+def read_tick_item(filename, key):
+    #task of read_ticks in a worker process, the key columns are added to tell the stocks of a batch
+    for _, df in tick_reader.read(filename, [key]):
+        df['market'], df['code'] = key
+        return key, df
+    return key, pd.DataFrame()
+
+def read_ticks(filename, keys = None, process_num = 1):
+    #dict of (market, code) -> frame of the non-empty stocks in keys, all stocks of the file when keys is None.
+    #the file is decoded in one pass over a memory map, with process_num > 1 the stocks are split over the worker processes
+    if process_num == 1: return {key: df for key, df in tick_reader.read(filename, keys) if not df.empty}
+    index = tick_reader.get_index(filename)
+    if index is None: return dict()
+    keys = list(index.keys()) if keys is None else [key for key in keys if key in index]
+    scheduler = CTaskScheduler(partial(read_tick_item, filename), process_num = process_num, num = 1, batch_rows = ct.TASK_BATCH_ROWS)
+    dead_list = scheduler.run(keys)
+    if len(dead_list) > 0: logger.error("read ticks of %s from %s failed" % (dead_list, filename))
+    df = scheduler.collect()
+    if df.empty: return dict()
+    return {(int(market), code): group.drop(['market', 'code'], axis = 1).reset_index(drop = True) for (market, code), group in df.groupby(['market', 'code'], sort = False)}
+
+#second labels of the ticks in a minute
+SECOND_LABELS = np.array([":%02d" % second for second in range(60)], dtype = object)
 def adjust_time(df):
-    s_index = 0
-    e_index = 0
-    time_list = df['time']
-    time_list_length = len(time_list)
-    for _index in range(1, time_list_length):
-        if time_list[s_index] == time_list[_index] and _index < time_list_length - 1:
-            e_index = _index
-        else:
-            if time_list[s_index] == time_list[_index] and _index == time_list_length - 1: e_index = _index
-            _length = (e_index - s_index + 1)
-            time_delta = int(60/_length)
-            for _tmp_index in range(_length):
-                z_index = s_index + _tmp_index
-                df.at[z_index, 'time'] = "%s:%02d" % (df.loc[z_index]['time'], time_delta * _tmp_index)
-            s_index = e_index + 1
-            e_index = s_index
-            if _index == time_list_length - 1 and s_index == _index:
-                #special deal with date where last row is 14:59 but notleast row is 14:55
-                df.at[s_index, 'time'] = "%s:%02d" % (df.loc[s_index]['time'], 0)
+    #the ticks of a minute are spread evenly over it by their position in the run of the same minute
+    times = df['time'].values
+    if len(times) < 2: return df
+    starts = np.empty(len(times), dtype = bool)
+    starts[0] = True
+    starts[1:] = times[1:] != times[:-1]
+    start_indexes = np.flatnonzero(starts)
+    run_ids = np.cumsum(starts) - 1
+    lengths = np.diff(np.append(start_indexes, len(times)))
+    seconds = (60 // lengths)[run_ids] * (np.arange(len(times)) - start_indexes[run_ids])
+    df['time'] = times + SECOND_LABELS[seconds]
     return df
 
 def exists(path):
@@ -287,11 +334,23 @@ def unzip(file_path, tic_dir):
         tic_file = os.path.join(tic_dir, names)
         if not os.path.exists(tic_file):
             zip_file.extract(names, tic_dir)
+            #the index is built once here instead of by every reader of the file
+            if tic_file.endswith('.tic'): tick_reader.get_index(tic_file)
     zip_file.close()
 
+def benchmark(filename, code_id, times = 10):
+    #decode the ticks of code_id in a full day file, returns the last frame and the mean seconds
+    start = time.time()
+    for _ in range(times): df = read_tick(filename, code_id)
+    return df, (time.time() - start) / times
+
 if __name__ == "__main__":
     code_id = '880001'
     tickname = '20180822.tic'
     ticname = os.path.join('/Volumes/data/quant/stock/data/tdx/tic', tickname)
-    df = read_tick(ticname, code_id)
+    df, cost = benchmark(ticname, code_id)
     print(df)
+    print("rows:%s, read_tick cost:%.4fs" % (len(df), cost))
+    start = time.time()
+    frames = read_ticks(ticname)
+    print("stocks:%s, read_ticks cost:%.4fs" % (len(frames), time.time() - start))
@@ -9,6 +9,7 @@ import traceback
 import pandas as pd
 import const as ct
 from common import create_redis_obj
+from base.ccache import frame_cache
 from base.clog import getLogger
 log = getLogger(__name__)
 def worker(client_id, func_name, df, key, subset):
@@ -20,11 +21,12 @@ def worker(client_id, func_name, df, key, subset):
         job = worker.getJob()
         info = json.loads(job.arguments.decode('utf-8'))
         tmp_df = pd.DataFrame(info, index=[0])
-        tmp_redis = redis.get(key)
-        if tmp_redis is not None: df = _pickle.loads(tmp_redis)
+        #the version is bumped with the blob, so readers reload the frame
+        cached_df = frame_cache.get(redis, key)
+        if not cached_df.empty: df = cached_df
         df = df.append(tmp_df)
         df = df.drop_duplicates(subset)
-        redis.set(key, _pickle.dumps(df, 2))
+        frame_cache.set(redis, key, df)
         job.sendWorkComplete()
 
 def main():